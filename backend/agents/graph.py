@@ -170,18 +170,21 @@ def create_note_processing_graph() -> StateGraph:
 
 
 async def process_note_with_agents(
-    image_bytes: bytes,
+    image_bytes: bytes = None,
     course_id: str = None,
     course_name: str = None,
     additional_context: str = None,
     user_id: str = None,
-    generate_qa: bool = True
+    generate_qa: bool = True,
+    image_path: str = None
 ) -> NoteProcessingState:
     """
     High-level function to process a note using the multi-agent system.
 
     Args:
-        image_bytes: Raw image data
+        image_bytes: Raw image data (optional if image_path is given)
+        image_path: Path to an already-saved image file; preferred over
+            image_bytes so the raw image is not carried through the graph state
         course_id: Optional course ID for RAG
         course_name: Optional course name
         additional_context: Optional user context
@@ -196,6 +199,7 @@ async def process_note_with_agents(
     # Create initial state
     initial_state = create_initial_state(
         image_bytes=image_bytes,
+        image_path=image_path,
         course_id=course_id,
         course_name=course_name,
         additional_context=additional_context,
@@ -193,11 +193,18 @@ async def ocr_agent(state: NoteProcessingState) -> NoteProcessingState:
 
     try:
         # Step 1: Extract text using OCR service
+        # Prefer the saved file over in-state bytes so the raw image is only
+        # held in memory for the duration of this agent
         image_bytes = state.get("image_bytes")
+        image_path = state.get("image_path")
+        if not image_bytes and image_path:
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
         if not image_bytes:
             raise ValueError("No image data provided")
 
         ocr_text, confidence = ocr_service.extract_text(image_bytes)
+        del image_bytes  # Release the raw image before the LLM round-trip
 
         if not ocr_text or len(ocr_text.strip()) == 0:
             raise ValueError("OCR failed to extract any text from the image")
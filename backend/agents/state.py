@@ -97,7 +97,8 @@ class NoteProcessingState(TypedDict, total=False):
     """
 
     # === Input Fields ===
-    image_bytes: bytes  # Raw image data
+    image_bytes: Optional[bytes]  # Raw image data (omitted when image_path is set)
+    image_path: Optional[str]  # Path to the saved image (read lazily by the OCR agent)
     course_id: Optional[str]  # Course ID for RAG context
     course_name: Optional[str]  # Course name for context
     additional_context: Optional[str]  # User-provided context
@@ -145,18 +146,24 @@ class NoteProcessingState(TypedDict, total=False):
 
 
 def create_initial_state(
-    image_bytes: bytes,
+    image_bytes: Optional[bytes] = None,
     course_id: Optional[str] = None,
     course_name: Optional[str] = None,
     additional_context: Optional[str] = None,
     user_id: Optional[str] = None,
-    generate_qa: bool = True
+    generate_qa: bool = True,
+    image_path: Optional[str] = None
 ) -> NoteProcessingState:
     """
     Create the initial state for the multi-agent workflow.
 
+    Either image_bytes or image_path must be provided. Passing a path keeps
+    the raw image out of the state that flows through every agent, so the
+    bytes only live in memory while the OCR agent is running.
+
     Args:
-        image_bytes: Raw image data to process
+        image_bytes: Raw image data to process (optional if image_path given)
+        image_path: Path to an already-saved image file (optional)
         course_id: Optional course ID for RAG context
         course_name: Optional course name
         additional_context: Optional user-provided context
@@ -169,6 +176,7 @@ def create_initial_state(
     return NoteProcessingState(
         # Input
         image_bytes=image_bytes,
+        image_path=image_path,
         course_id=course_id,
         course_name=course_name,
         additional_context=additional_context,
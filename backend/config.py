@@ -25,10 +25,32 @@ class Settings(BaseSettings):
     )
 
     # Connection pool settings
-    db_pool_size: int = 5
-    db_max_overflow: int = 10
+    # Sized for concurrent /process-note traffic: long-lived pooled
+    # connections avoid the ~5-20ms TCP/TLS handshake per request
+    db_pool_size: int = 20
+    db_max_overflow: int = 40
     db_pool_timeout: int = 30
-    db_pool_recycle: int = 3600
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # Worker thread pools
+    # OCR preprocessing (PIL resize/re-encode) is CPU-bound and the Vision/
+    # Claude calls block a thread each; dedicated pools keep them from
+    # starving the default executor used for disk and DB offloading
+    ocr_worker_threads: int = 4
+    llm_worker_threads: int = 8
+    embed_worker_threads: int = 2
+
+    # Embedding model backend: "onnx" runs an INT8 dynamically-quantized
+    # export on CPU int8 GEMM kernels (2-4x faster encodes); "torch" keeps
+    # the stock FP32 PyTorch model. Falls back to torch if the ONNX stack
+    # is unavailable.
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "onnx")
+
+    # Multi-process encoding pool for large embedding batches. Each worker
+    # loads its own copy of the model (~500MB for the torch backend), so
+    # this is opt-in and defaults to a single in-process encoder.
+    embedding_pool_workers: int = int(os.getenv("EMBEDDING_POOL_WORKERS", "0"))
 
     # Auth0 configuration
     auth0_domain: str = os.getenv("AUTH0_DOMAIN", "")
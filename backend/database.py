@@ -1,30 +1,57 @@
 """Database configuration and session management"""
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
-# Create engine with connection pool
+# Sync engine: used by the standalone scripts and the agent pipeline, which
+# run outside the uvicorn event loop. Request handlers use the async engine.
 engine = create_engine(
     settings.database_url,
     pool_size=settings.db_pool_size,
     max_overflow=settings.db_max_overflow,
     pool_timeout=settings.db_pool_timeout,
     pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    # Batch executemany statements (bulk embedding updates from the indexing
+    # script) into pages of ~100 per round-trip instead of one RTT per row
+    executemany_mode="values_plus_batch",
     echo=settings.debug  # SQL logging in debug mode
 )
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the FastAPI request path: queries await on asyncpg instead
+# of blocking the event loop, so other requests keep processing during a
+# slow query
+async_engine = create_async_engine(
+    settings.database_url.replace("postgresql://", "postgresql+asyncpg://", 1),
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    # LIFO checkout reuses the hottest connections (warm TCP state, cached
+    # plans) and lets idle overflow connections age out via pool_recycle
+    pool_use_lifo=True,
+    echo=settings.debug
+)
+
+# Async session factory; expire_on_commit=False keeps attributes readable
+# after commit without an implicit refresh round-trip
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 # Dependency for FastAPI
-def get_db():
-    """Get database session for FastAPI dependency injection"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Get async database session for FastAPI dependency injection"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
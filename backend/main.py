@@ -1,16 +1,23 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, FileResponse
+from sqlalchemy import select, text as sql_text
+from cachetools import TTLCache
+from sqlalchemy.ext.asyncio import AsyncSession
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Optional
 import aiofiles
+import asyncio
+import hashlib
 import os
 import time
 import logging
 from pathlib import Path
 
+import schemas
 from config import settings
-from database import get_db
+from database import get_db, AsyncSessionLocal, SessionLocal
 from models import User, Course, Document
 from schemas import (
     HealthResponse,
@@ -24,8 +31,10 @@ from schemas import (
 )
 from services.ocr_service import ocr_service
 from services.llm_service import llm_service
+from services.batcher import RequestBatcher
+from services import ocr_cache
 from services.auth_service import get_current_user, get_current_user_optional
-from services.embedding_service import get_embedding_service
+from services.embed_batcher import embed_batcher
 from services.vector_store import get_vector_store
 from routes import user_router, courses_router, documents_router
 from agents.graph import process_note_with_agents
@@ -38,6 +47,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Hoisted per-request constants (settings never change after import)
+_UPLOAD_DIR = Path(settings.upload_dir)
+_MAX_MB_STR = f"{settings.max_file_size / 1024 / 1024:.1f}MB"
+
+# Upload streaming chunk size: keeps per-connection memory constant (~1MB)
+# instead of buffering whole files
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Full-pipeline result cache for /process-note-agents: re-uploading the
+# same photo with the same options (duplicate device uploads, client
+# retries) returns the earlier result in milliseconds instead of re-running
+# the 30-60s agent workflow. Keyed by content hash + user + options; bump
+# the version whenever prompts or the agent graph change so stale results
+# invalidate cleanly.
+_PIPELINE_CACHE_VERSION = 1
+_pipeline_cache: TTLCache = TTLCache(maxsize=128, ttl=3600)
+
+
+# Dedicated worker pools: OCR preprocessing is CPU-bound and the Vision/
+# Claude calls park a thread each, so they get their own bounded executors
+# instead of competing with asyncio.to_thread's shared default pool (which
+# also serves disk writes and vector-store lookups)
+_ocr_executor = ThreadPoolExecutor(
+    max_workers=settings.ocr_worker_threads, thread_name_prefix="ocr"
+)
+_llm_executor = ThreadPoolExecutor(
+    max_workers=settings.llm_worker_threads, thread_name_prefix="llm"
+)
+
+
+# Request batchers: concurrent uploads coalesce into one batched OCR API call
+# and one group of overlapped LLM calls instead of serializing per request
+async def _ocr_batch(images):
+    return await asyncio.get_running_loop().run_in_executor(
+        _ocr_executor, ocr_service.extract_text_batch, images
+    )
+
+
+async def _format_note_batch(items):
+    # Anthropic has no batched forward pass, so fan the group out concurrently;
+    # queued requests overlap instead of blocking the event loop one by one
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(_llm_executor, llm_service.format_note, ocr_text, context)
+            for ocr_text, context in items
+        ),
+        return_exceptions=True
+    )
+
+
+ocr_batcher = RequestBatcher(_ocr_batch, max_batch_size=8, max_wait_ms=20, name="ocr")
+llm_batcher = RequestBatcher(_format_note_batch, max_batch_size=8, max_wait_ms=20, name="llm")
+
 
 # Lifespan event handler
 @asynccontextmanager
@@ -46,13 +109,38 @@ async def lifespan(_app: FastAPI):
     # Startup
     logger.info("Starting up application...")
     # Ensure upload directory exists
-    Path(settings.upload_dir).mkdir(parents=True, exist_ok=True)
+    _UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    # Start the OCR/LLM batch workers
+    ocr_batcher.start()
+    llm_batcher.start()
+    embed_batcher.start()
+
+    # Warm every exported schema's JSON-schema build so the cost lands here
+    # instead of on the first request (or first /docs hit) after a deploy
+    for name in schemas.__all__:
+        getattr(schemas, name).model_json_schema()
+
+    # Pre-warm a handful of pooled connections so the first requests don't
+    # pay the TCP + auth handshake cold-start
+    async def _warm_connection():
+        async with AsyncSessionLocal() as session:
+            await session.execute(sql_text("SELECT 1"))
+
+    try:
+        await asyncio.gather(*(_warm_connection() for _ in range(5)))
+    except Exception as e:
+        logger.warning(f"Connection pool pre-warm failed: {e}")
     logger.info("Database ready")
 
     yield
 
     # Shutdown
     logger.info("Shutting down application...")
+    await ocr_batcher.stop()
+    await llm_batcher.stop()
+    await embed_batcher.stop()
+    _ocr_executor.shutdown(wait=False)
+    _llm_executor.shutdown(wait=False)
 
 
 # Create FastAPI app
@@ -60,7 +148,10 @@ app = FastAPI(
     title="SnapNote AI API",
     description="AI-powered note processing platform",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes large note payloads several times faster than the
+    # stdlib encoder, shortening the event-loop stall per response
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -112,31 +203,30 @@ async def upload_image(file: UploadFile = File(...)):
                 detail="只支持图片文件"
             )
         
-        # 读取文件内容
-        contents = await file.read()
-        
-        # 验证文件大小
-        if len(contents) > settings.max_file_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"文件大小超过限制 ({settings.max_file_size / 1024 / 1024}MB)"
-            )
-        
         # 生成唯一文件名
         timestamp = int(time.time() * 1000)
         filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join(settings.upload_dir, filename)
-        
-        # 保存文件
+        file_path = _UPLOAD_DIR / filename
+
+        # 分块流式写入磁盘，边写边校验大小（内存占用恒定，与文件大小无关）
+        total_size = 0
         async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(contents)
-        
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                total_size += len(chunk)
+                if total_size > settings.max_file_size:
+                    file_path.unlink(missing_ok=True)
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"文件大小超过限制 ({_MAX_MB_STR})"
+                    )
+                await f.write(chunk)
+
         logger.info(f"文件上传成功: {filename}")
         
         return UploadResponse(
             filename=filename,
             message="文件上传成功",
-            file_path=file_path
+            file_path=str(file_path)
         )
         
     except HTTPException:
@@ -160,8 +250,13 @@ async def ocr_image(file: UploadFile = File(...)):
         # 读取文件内容
         contents = await file.read()
         
-        # 调用 OCR 服务
-        text, confidence = ocr_service.extract_text(contents)
+        # 调用 OCR 服务（内容哈希缓存 + 批处理队列合并并发请求）
+        ocr_key = ocr_cache.cache_key(contents)
+        cached = ocr_cache.get(ocr_key)
+        if cached is None:
+            cached = await ocr_batcher.submit(contents)
+            ocr_cache.put(ocr_key, cached)
+        text, confidence = cached
         
         return {
             "success": True,
@@ -186,7 +281,7 @@ async def process_note(
     course_id: str = Form(None),
     title: str = Form(None),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Complete note processing pipeline: Upload -> OCR -> LLM formatting -> Save to database
@@ -205,27 +300,52 @@ async def process_note(
     Returns:
         ProcessNoteResponse: Processing result with document ID (if saved)
     """
-    start_time = time.time()
+    # Monotonic clock: immune to wall-clock jumps (no negative durations)
+    # and cheaper than the time.time() syscall
+    t0 = time.perf_counter_ns()
     saved_file_path = None
+    tmp_file_path = None
 
     try:
         user_email = current_user.email if current_user else "anonymous"
         logger.info(f"Processing note for user {user_email}: {file.filename}")
 
-        # 1. Read file
-        contents = await file.read()
-
-        # Save uploaded file
+        # 1. Read the upload in chunks, hashing for the OCR cache key as we go
         timestamp = int(time.time() * 1000)
         filename = f"{timestamp}_{file.filename}"
-        saved_file_path = os.path.join(settings.upload_dir, filename)
-
-        async with aiofiles.open(saved_file_path, 'wb') as f:
-            await f.write(contents)
+        saved_file_path = _UPLOAD_DIR / filename
+
+        hasher = hashlib.sha256()
+        contents = bytearray()
+        while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            contents += chunk
+        contents = bytes(contents)
+
+        # 2. Overlap the disk write with OCR: the write (~tens of ms) hides
+        # under the OCR round trip, and the bytes never get read back from disk.
+        # Write to a .tmp sibling first; it is promoted with an atomic
+        # os.replace only once the pipeline succeeds, so a crash mid-request
+        # never leaves a partial file at the final path
+        tmp_file_path = saved_file_path.with_name(saved_file_path.name + ".tmp")
+        write_task = asyncio.create_task(
+            asyncio.to_thread(tmp_file_path.write_bytes, contents)
+        )
 
-        # 2. OCR recognition
+        # OCR recognition (content-hash cached, batched with other in-flight requests)
         logger.info("Step 1: OCR processing...")
-        ocr_text, confidence = ocr_service.extract_text(contents)
+        try:
+            ocr_key = hasher.digest()
+            cached = ocr_cache.get(ocr_key)
+            if cached is None:
+                cached = await ocr_batcher.submit(contents)
+                ocr_cache.put(ocr_key, cached)
+        finally:
+            # The saved file is referenced (and cleaned up) later, so make
+            # sure the write has landed before leaving this block
+            await write_task
+        del contents
+        ocr_text, confidence = cached
 
         if not ocr_text or len(ocr_text.strip()) < 10:
             raise Exception("OCR failed or text content too short")
@@ -240,58 +360,77 @@ async def process_note(
 
         if use_rag:
             # Verify course exists and belongs to user
-            course = db.query(Course).filter(
-                Course.id == course_id,
-                Course.user_id == current_user.id
-            ).first()
+            course = (await db.execute(
+                select(Course).where(
+                    Course.id == course_id,
+                    Course.user_id == current_user.id
+                )
+            )).scalar_one_or_none()
 
             if not course:
                 raise HTTPException(status_code=404, detail="Course not found")
 
             # 3. RAG: Get historical context from similar notes
             logger.info("Step 2: Generating embedding for context retrieval...")
-            embedding_service = get_embedding_service()
-            query_embedding = embedding_service.create_embedding(ocr_text)
+            query_embedding = await embed_batcher.submit(ocr_text)
 
             logger.info("Step 3: Retrieving historical context...")
-            vector_store = get_vector_store()
-            historical_context = vector_store.get_context_for_new_note(
-                db=db,
-                new_note_text=ocr_text,
-                new_note_embedding=query_embedding,
-                course_id=course_id,
-                top_k=3  # Retrieve top 3 relevant historical notes
-            )
+
+            # The vector store runs on a sync session; keep the similarity
+            # search off the event loop
+            def _get_context():
+                with SessionLocal() as sync_db:
+                    return get_vector_store().get_context_for_new_note(
+                        db=sync_db,
+                        new_note_text=ocr_text,
+                        new_note_embedding=query_embedding,
+                        course_id=course_id,
+                        top_k=3  # Retrieve top 3 relevant historical notes
+                    )
+
+            historical_context = await asyncio.to_thread(_get_context)
 
             # 4. LLM formatting with RAG enhancement
             logger.info(f"Step 4: LLM formatting with RAG ({len(historical_context)} historical notes)...")
             if historical_context:
-                # Use RAG-enhanced formatting
-                formatted_note = llm_service.format_note_with_rag(
-                    ocr_text=ocr_text,
-                    course_name=course.name,
-                    historical_context=historical_context,
-                    additional_context=additional_context
+                # Use RAG-enhanced formatting; the Claude call parks for
+                # seconds, so it runs on the llm executor instead of
+                # blocking the event loop
+                formatted_note = await asyncio.get_running_loop().run_in_executor(
+                    _llm_executor,
+                    lambda: llm_service.format_note_with_rag(
+                        ocr_text=ocr_text,
+                        course_name=course.name,
+                        historical_context=historical_context,
+                        additional_context=additional_context
+                    )
                 )
             else:
                 # Fallback to basic formatting if no historical context
                 logger.info("No historical context found, using basic formatting")
-                formatted_note = llm_service.format_note(ocr_text, additional_context)
+                formatted_note = await llm_batcher.submit((ocr_text, additional_context))
 
             # 5. Save to database
             # Generate title from formatted note if not provided
             if not title:
-                # Extract first line or first 50 characters as title
-                lines = formatted_note.split('\n')
-                title = lines[0].strip('#').strip()[:100] if lines else "Untitled Note"
+                # Title comes from the first line; find() avoids splitting
+                # the whole note into a list just to read one line
+                nl = formatted_note.find('\n')
+                first_line = formatted_note[:nl] if nl != -1 else formatted_note
+                title = first_line.strip('#').strip()[:100] or "Untitled Note"
 
             # Create excerpt from formatted note
             excerpt = formatted_note[:200]
 
             # Generate embedding for the formatted note
-            final_embedding = embedding_service.create_embedding(formatted_note)
+            final_embedding = await embed_batcher.submit(formatted_note)
 
-            # Create document
+            # Promote the upload to its final name before the row referencing
+            # it is committed (atomic rename, same directory)
+            os.replace(tmp_file_path, saved_file_path)
+
+            # Create document (one duration read, reused for the response)
+            processing_time = (time.perf_counter_ns() - t0) / 1e9
             document = Document(
                 course_id=course_id,
                 user_id=current_user.id,
@@ -299,8 +438,8 @@ async def process_note(
                 original_text=ocr_text,
                 formatted_note=formatted_note,
                 excerpt=excerpt,
-                image_path=saved_file_path,
-                processing_time=time.time() - start_time,
+                image_path=str(saved_file_path),  # Path -> str at the DB boundary
+                processing_time=processing_time,
                 embedding=final_embedding,
                 doc_metadata={
                     "ocr_confidence": confidence,
@@ -311,17 +450,18 @@ async def process_note(
             )
 
             db.add(document)
-            db.commit()
-            db.refresh(document)
+            await db.commit()
+            # No refresh needed: id is generated client-side by uuid.uuid4
             document_id = str(document.id)
             logger.info(f"Document saved: {document_id}")
         else:
             # No RAG, just basic LLM formatting
             logger.info("Step 2: Basic LLM formatting (no RAG - not authenticated or no course)")
-            formatted_note = llm_service.format_note(ocr_text, additional_context)
+            formatted_note = await llm_batcher.submit((ocr_text, additional_context))
             logger.info("Skipping document save (no authentication or course)")
+            os.replace(tmp_file_path, saved_file_path)
+            processing_time = (time.perf_counter_ns() - t0) / 1e9
 
-        processing_time = time.time() - start_time
         logger.info(f"Processing completed in {processing_time:.2f}s")
 
         return ProcessNoteResponse(
@@ -334,16 +474,20 @@ async def process_note(
         )
 
     except HTTPException:
-        # Clean up file if it was saved
-        if saved_file_path and os.path.exists(saved_file_path):
-            os.remove(saved_file_path)
+        # Clean up whichever file exists (single unlink syscall, no TOCTOU race)
+        if tmp_file_path:
+            tmp_file_path.unlink(missing_ok=True)
+        if saved_file_path:
+            saved_file_path.unlink(missing_ok=True)
         raise
     except Exception as e:
-        # Clean up file if it was saved
-        if saved_file_path and os.path.exists(saved_file_path):
-            os.remove(saved_file_path)
+        # Clean up whichever file exists (single unlink syscall, no TOCTOU race)
+        if tmp_file_path:
+            tmp_file_path.unlink(missing_ok=True)
+        if saved_file_path:
+            saved_file_path.unlink(missing_ok=True)
 
-        processing_time = time.time() - start_time
+        processing_time = (time.perf_counter_ns() - t0) / 1e9
         logger.error(f"Processing failed: {str(e)}")
 
         return ProcessNoteResponse(
@@ -355,6 +499,36 @@ async def process_note(
             error=str(e)
         )
 
+@app.api_route("/uploads/{filename}", methods=["GET", "HEAD"])
+async def get_upload(filename: str, request: Request):
+    """
+    获取上传的文件（支持 HEAD 和条件请求）
+
+    Uploaded filenames embed a millisecond timestamp, so a file never changes
+    once written - the timestamp prefix doubles as a strong ETag and the
+    response can be cached as immutable.
+
+    Args:
+        filename: 文件名
+    """
+    file_path = _UPLOAD_DIR / filename
+
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    etag = f'"{filename.split("_", 1)[0]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+
+    # Conditional GET: skip the body entirely when the client already has it
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(file_path, headers=headers)
+
+
 @app.delete("/uploads/{filename}")
 async def delete_upload(filename: str):
     """
@@ -364,12 +538,13 @@ async def delete_upload(filename: str):
         filename: 文件名
     """
     try:
-        file_path = os.path.join(settings.upload_dir, filename)
+        file_path = _UPLOAD_DIR / filename
 
-        if not os.path.exists(file_path):
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="文件不存在")
 
-        os.remove(file_path)
         logger.info(f"文件删除成功: {filename}")
 
         return {"message": "文件删除成功"}
@@ -388,8 +563,9 @@ async def process_note_with_multi_agents(
     course_id: str = Form(None),
     title: str = Form(None),
     generate_qa: bool = Form(True),
+    force_refresh: bool = Form(False),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Process note using the Multi-Agent System (Phase 5).
@@ -414,6 +590,7 @@ async def process_note_with_multi_agents(
         course_id: Course ID for RAG context (optional)
         title: Document title (optional)
         generate_qa: Whether to generate Q&A materials (default: True)
+        force_refresh: Bypass the duplicate-upload result cache (default: False)
         current_user: Current authenticated user (injected, optional)
         db: Database session (injected)
 
@@ -426,23 +603,45 @@ async def process_note_with_multi_agents(
         user_email = current_user.email if current_user else "anonymous"
         logger.info(f"[Multi-Agent] Processing note for user {user_email}: {file.filename}")
 
-        # 1. Read and save file
-        contents = await file.read()
-
+        # 1. Stream file to disk in chunks (constant memory per upload),
+        # hashing along the way for the duplicate-upload cache
         timestamp = int(time.time() * 1000)
         filename = f"{timestamp}_{file.filename}"
-        saved_file_path = os.path.join(settings.upload_dir, filename)
+        saved_file_path = _UPLOAD_DIR / filename
 
+        hasher = hashlib.sha256()
         async with aiofiles.open(saved_file_path, 'wb') as f:
-            await f.write(contents)
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                await f.write(chunk)
+
+        # Same image + same user + same options => same result; skip the
+        # whole agent workflow for duplicate uploads
+        pipeline_key = (
+            _PIPELINE_CACHE_VERSION,
+            hasher.digest(),
+            str(current_user.id) if current_user else None,
+            course_id,
+            additional_context,
+            generate_qa,
+        )
+        if not force_refresh:
+            cached_response = _pipeline_cache.get(pipeline_key)
+            if cached_response is not None:
+                # The original upload's file is already on disk
+                saved_file_path.unlink(missing_ok=True)
+                logger.info("[Multi-Agent] Duplicate upload, returning cached result")
+                return cached_response
 
         # 2. Get course info if provided
         course_name = None
         if current_user and course_id:
-            course = db.query(Course).filter(
-                Course.id == course_id,
-                Course.user_id == current_user.id
-            ).first()
+            course = (await db.execute(
+                select(Course).where(
+                    Course.id == course_id,
+                    Course.user_id == current_user.id
+                )
+            )).scalar_one_or_none()
             if course:
                 course_name = course.name
             else:
@@ -450,9 +649,11 @@ async def process_note_with_multi_agents(
                 course_id = None  # Reset course_id if not found
 
         # 3. Run multi-agent processing
+        # Pass the saved file path instead of bytes so the raw image is
+        # not duplicated into the agent graph state
         logger.info("[Multi-Agent] Starting multi-agent workflow...")
         final_state = await process_note_with_agents(
-            image_bytes=contents,
+            image_path=str(saved_file_path),
             course_id=course_id,
             course_name=course_name,
             additional_context=additional_context,
@@ -484,17 +685,17 @@ async def process_note_with_multi_agents(
                 ocr_text = final_state.get("ocr_raw_text", "")
                 metadata = final_state.get("final_metadata", {})
 
-                # Generate title if not provided
+                # Generate title if not provided (first line only, no full split)
                 if not title:
-                    lines = final_note.split('\n')
-                    title = lines[0].strip('#').strip()[:100] if lines else "Untitled Note"
+                    nl = final_note.find('\n')
+                    first_line = final_note[:nl] if nl != -1 else final_note
+                    title = first_line.strip('#').strip()[:100] or "Untitled Note"
 
                 # Create excerpt
                 excerpt = final_note[:200]
 
                 # Generate embedding
-                embedding_service = get_embedding_service()
-                final_embedding = embedding_service.create_embedding(final_note)
+                final_embedding = await embed_batcher.submit(final_note)
 
                 # Create document
                 document = Document(
@@ -504,7 +705,7 @@ async def process_note_with_multi_agents(
                     original_text=ocr_text,
                     formatted_note=final_note,
                     excerpt=excerpt,
-                    image_path=saved_file_path,
+                    image_path=str(saved_file_path),  # Path -> str at the DB boundary
                     processing_time=metadata.get("processing_time_total", 0),
                     embedding=final_embedding,
                     doc_metadata={
@@ -519,8 +720,8 @@ async def process_note_with_multi_agents(
                 )
 
                 db.add(document)
-                db.commit()
-                db.refresh(document)
+                await db.commit()
+                # No refresh needed: id is generated client-side by uuid.uuid4
                 document_id = str(document.id)
                 logger.info(f"[Multi-Agent] Document saved: {document_id}")
 
@@ -591,7 +792,7 @@ async def process_note_with_multi_agents(
 
         logger.info(f"[Multi-Agent] Processing completed successfully in {metadata_response.processing_time_total:.2f}s")
 
-        return MultiAgentProcessNoteResponse(
+        response = MultiAgentProcessNoteResponse(
             success=True,
             original_text=final_state.get("ocr_raw_text", ""),
             corrected_text=final_state.get("ocr_corrected_text", ""),
@@ -606,13 +807,18 @@ async def process_note_with_multi_agents(
             error=None
         )
 
+        # Only successful runs are worth replaying for duplicate uploads
+        _pipeline_cache[pipeline_key] = response
+
+        return response
+
     except HTTPException:
-        if saved_file_path and os.path.exists(saved_file_path):
-            os.remove(saved_file_path)
+        if saved_file_path:
+            saved_file_path.unlink(missing_ok=True)
         raise
     except Exception as e:
-        if saved_file_path and os.path.exists(saved_file_path):
-            os.remove(saved_file_path)
+        if saved_file_path:
+            saved_file_path.unlink(missing_ok=True)
 
         logger.error(f"[Multi-Agent] Processing failed with error: {str(e)}")
 
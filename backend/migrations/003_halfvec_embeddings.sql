@@ -0,0 +1,29 @@
+-- Migration: Store embeddings as half-precision vectors
+-- Date: 2026-08-30
+-- Description: Converts the embedding column from vector(384) to halfvec(384),
+--              halving storage, network payload and HNSW index memory
+--              (requires pgvector >= 0.7)
+
+-- Drop the old full-precision HNSW index
+DROP INDEX IF EXISTS documents_embedding_idx;
+
+-- Convert the column to half precision
+ALTER TABLE documents
+ALTER COLUMN embedding TYPE halfvec(384);
+
+-- Recreate the HNSW index with half-precision cosine ops
+CREATE INDEX IF NOT EXISTS documents_embedding_idx
+ON documents
+USING hnsw (embedding halfvec_cosine_ops);
+
+-- Update the column comment
+COMMENT ON COLUMN documents.embedding IS 'Half-precision vector embedding (384 dimensions) for semantic similarity search using sentence-transformers';
+
+-- Verify the change
+SELECT
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE table_name = 'documents'
+AND column_name = 'embedding';
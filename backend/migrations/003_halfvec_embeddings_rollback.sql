@@ -0,0 +1,26 @@
+-- Rollback: Restore full-precision embeddings
+-- Date: 2026-08-30
+-- Description: Converts the embedding column back from halfvec(384) to vector(384)
+
+-- Drop the half-precision HNSW index
+DROP INDEX IF EXISTS documents_embedding_idx;
+
+-- Convert the column back to full precision
+ALTER TABLE documents
+ALTER COLUMN embedding TYPE vector(384);
+
+-- Recreate the original HNSW index
+CREATE INDEX IF NOT EXISTS documents_embedding_idx
+ON documents
+USING hnsw (embedding vector_cosine_ops);
+
+-- Restore the column comment
+COMMENT ON COLUMN documents.embedding IS 'Vector embedding (384 dimensions) for semantic similarity search using sentence-transformers';
+
+-- Verify the change
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'documents'
+AND column_name = 'embedding';
@@ -0,0 +1,24 @@
+-- Migration: Composite indexes for the dominant list/get query patterns
+-- Date: 2026-08-30
+-- Description: Every list/get route filters by user_id or course_id plus
+--              status and orders by created_at/updated_at. The single-column
+--              FK indexes force Postgres to filter and sort after the index
+--              scan; these composite B-tree indexes match the access pattern.
+
+-- list_courses: WHERE user_id = ? AND status = ? ORDER BY updated_at DESC
+CREATE INDEX IF NOT EXISTS ix_courses_user_status_updated
+ON courses (user_id, status, updated_at DESC);
+
+-- list_documents_in_course: WHERE course_id = ? AND status = ? ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS ix_documents_course_status_created
+ON documents (course_id, status, created_at DESC);
+
+-- Single-document routes: WHERE user_id = ? (AND status = ?)
+CREATE INDEX IF NOT EXISTS ix_documents_user_status
+ON documents (user_id, status);
+
+-- Verify the change
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename IN ('courses', 'documents')
+ORDER BY indexname;
@@ -0,0 +1,13 @@
+-- Rollback: Remove composite list-query indexes
+-- Date: 2026-08-30
+-- Description: Drops the composite indexes added in migration 004
+
+DROP INDEX IF EXISTS ix_courses_user_status_updated;
+DROP INDEX IF EXISTS ix_documents_course_status_created;
+DROP INDEX IF EXISTS ix_documents_user_status;
+
+-- Verify the change
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename IN ('courses', 'documents')
+ORDER BY indexname;
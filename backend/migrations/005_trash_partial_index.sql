@@ -0,0 +1,22 @@
+-- Migration: Partial index for trash views
+-- Date: 2026-08-30
+-- Description: Trashed rows are a small fraction of the table, but trash
+--              listings (status='trash', most recently deleted first) still
+--              walk the general composite indexes. A partial index over only
+--              the trashed rows keeps those views to a tiny ordered range
+--              scan and costs nothing on the active-row hot path.
+
+CREATE INDEX IF NOT EXISTS ix_documents_trash
+ON documents (user_id, deleted_at DESC)
+WHERE status = 'trash';
+
+CREATE INDEX IF NOT EXISTS ix_courses_trash
+ON courses (user_id, deleted_at DESC)
+WHERE status = 'trash';
+
+-- Verify the change
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename IN ('courses', 'documents')
+  AND indexname LIKE '%trash%'
+ORDER BY indexname;
@@ -0,0 +1,4 @@
+-- Rollback: Partial index for trash views
+
+DROP INDEX IF EXISTS ix_documents_trash;
+DROP INDEX IF EXISTS ix_courses_trash;
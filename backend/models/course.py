@@ -1,5 +1,5 @@
 """Course model"""
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, CheckConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -25,6 +25,16 @@ class Course(Base):
 
     __table_args__ = (
         CheckConstraint("status IN ('active', 'trash')", name='courses_status_check'),
+        # Matches the list_courses access pattern: filter by user + status,
+        # order by updated_at DESC - allows an index-only range scan
+        Index('ix_courses_user_status_updated', 'user_id', 'status', text('updated_at DESC')),
+        # Partial index for trash listings: only the (few) trashed rows are
+        # indexed, keeping the view to a tiny ordered range scan at zero
+        # cost on the active-row hot path
+        Index(
+            'ix_courses_trash', 'user_id', text('deleted_at DESC'),
+            postgresql_where=text("status = 'trash'")
+        ),
     )
 
     # Relationships
@@ -1,9 +1,9 @@
 """Document model"""
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Float, CheckConstraint
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Float, CheckConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 import uuid
 
 from database import Base
@@ -17,20 +17,36 @@ class Document(Base):
     course_id = Column(UUID(as_uuid=True), ForeignKey("courses.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     title = Column(String(500), nullable=False)
-    original_text = Column(Text, nullable=False)
-    formatted_note = Column(Text, nullable=False)
+    # The text bodies and embedding are deferred: most queries (ownership
+    # checks, soft deletes, moves) only touch metadata, and skipping these
+    # columns keeps those row fetches to a few hundred bytes. Paths that
+    # actually need them opt in with undefer().
+    original_text = deferred(Column(Text, nullable=False))
+    formatted_note = deferred(Column(Text, nullable=False))
     excerpt = Column(String(200))
     image_path = Column(String(512))
     status = Column(String(20), default='active')
     processing_time = Column(Float)
     doc_metadata = Column(JSONB, default={}, name='metadata')  # Column name 'metadata', property 'doc_metadata'
-    embedding = Column(Vector(384))  # 384-dimensional vector for semantic search
+    embedding = deferred(Column(HALFVEC(384)))  # 384-dimensional half-precision vector for semantic search
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True))
 
     __table_args__ = (
         CheckConstraint("status IN ('active', 'trash')", name='documents_status_check'),
+        # Matches the list-documents-in-course access pattern: filter by
+        # course + status, order by created_at DESC
+        Index('ix_documents_course_status_created', 'course_id', 'status', text('created_at DESC')),
+        # Matches the per-user ownership checks on single-document routes
+        Index('ix_documents_user_status', 'user_id', 'status'),
+        # Partial index for trash listings: only the (few) trashed rows are
+        # indexed, keeping the view to a tiny ordered range scan at zero
+        # cost on the active-row hot path
+        Index(
+            'ix_documents_trash', 'user_id', text('deleted_at DESC'),
+            postgresql_where=text("status = 'trash'")
+        ),
     )
 
     # Relationships
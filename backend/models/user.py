@@ -1,5 +1,5 @@
 """User model"""
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import Column, String, Boolean, DateTime, select
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -28,9 +28,12 @@ class User(Base):
     documents = relationship("Document", back_populates="user", cascade="all, delete-orphan")
 
     @classmethod
-    def get_or_create_from_auth0(cls, db, auth0_user):
+    async def get_or_create_from_auth0(cls, db, auth0_user):
         """Get existing user or create new one from Auth0 user info"""
-        user = db.query(cls).filter(cls.auth0_user_id == auth0_user['sub']).first()
+        result = await db.execute(
+            select(cls).where(cls.auth0_user_id == auth0_user['sub'])
+        )
+        user = result.scalar_one_or_none()
 
         if not user:
             user = cls(
@@ -41,7 +44,6 @@ class User(Base):
                 email_verified=auth0_user.get('email_verified', False)
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
 
         return user
@@ -1,42 +1,77 @@
 """Course routes"""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from datetime import datetime
 
 from database import get_db
-from models import Course, User
+from models import Course, Document, User
 from services.auth_service import get_current_user
 from schemas.course import CourseCreate, CourseUpdate, CourseResponse
 
 router = APIRouter(prefix="/api/courses", tags=["courses"])
 
 
+async def _get_owned_course(
+    db: AsyncSession,
+    course_id: str,
+    user_id,
+    status: str = None
+) -> Course:
+    """Load a course owned by the user, raising 404 if not found"""
+    stmt = select(Course).where(
+        Course.id == course_id,
+        Course.user_id == user_id
+    )
+    if status is not None:
+        stmt = stmt.where(Course.status == status)
+
+    result = await db.execute(stmt)
+    course = result.scalar_one_or_none()
+
+    if not course:
+        detail = "Course not found in trash" if status == 'trash' else "Course not found"
+        raise HTTPException(status_code=404, detail=detail)
+
+    return course
+
+
 @router.get("/", response_model=List[CourseResponse])
 async def list_courses(
     status: str = 'active',
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all courses for authenticated user"""
-    courses = db.query(Course).filter(
-        Course.user_id == current_user.id,
-        Course.status == status
-    ).order_by(Course.updated_at.desc()).all()
+    # Count active documents in SQL instead of the Course.document_count
+    # property, which lazy-loads every Document row per course (1+N queries)
+    result = await db.execute(
+        select(
+            Course,
+            func.count(Document.id).filter(Document.status == 'active').label('doc_count')
+        ).outerjoin(
+            Document, Document.course_id == Course.id
+        ).where(
+            Course.user_id == current_user.id,
+            Course.status == status
+        ).group_by(Course.id).order_by(Course.updated_at.desc())
+    )
 
+    # model_construct skips first-pass validation: the values come straight
+    # from typed DB columns, and FastAPI validates once more via response_model
     return [
-        CourseResponse(
+        CourseResponse.model_construct(
             id=str(course.id),
             name=course.name,
             description=course.description,
             color=course.color,
             icon=course.icon,
-            document_count=course.document_count,
+            document_count=doc_count,
             status=course.status,
             created_at=course.created_at,
             updated_at=course.updated_at
         )
-        for course in courses
+        for course, doc_count in result.all()
     ]
 
 
@@ -44,7 +79,7 @@ async def list_courses(
 async def create_course(
     course_data: CourseCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new course"""
     course = Course(
@@ -55,9 +90,9 @@ async def create_course(
         icon=course_data.icon
     )
     db.add(course)
-    db.commit()
-    db.refresh(course)
+    await db.commit()
 
+    # No refresh needed: id is generated client-side and name comes from the request
     return {"id": str(course.id), "name": course.name}
 
 
@@ -65,16 +100,19 @@ async def create_course(
 async def get_course(
     course_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific course"""
-    course = db.query(Course).filter(
-        Course.id == course_id,
-        Course.user_id == current_user.id
-    ).first()
-
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
+    course = await _get_owned_course(db, course_id, current_user.id)
+
+    # Aggregate in SQL; the document_count property would lazy-load every
+    # Document row (and lazy loads don't work on AsyncSession)
+    doc_count = (await db.execute(
+        select(func.count(Document.id)).where(
+            Document.course_id == course.id,
+            Document.status == 'active'
+        )
+    )).scalar()
 
     return CourseResponse(
         id=str(course.id),
@@ -82,7 +120,7 @@ async def get_course(
         description=course.description,
         color=course.color,
         icon=course.icon,
-        document_count=course.document_count,
+        document_count=doc_count,
         status=course.status,
         created_at=course.created_at,
         updated_at=course.updated_at
@@ -94,16 +132,10 @@ async def update_course(
     course_id: str,
     course_data: CourseUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a course"""
-    course = db.query(Course).filter(
-        Course.id == course_id,
-        Course.user_id == current_user.id
-    ).first()
-
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
+    course = await _get_owned_course(db, course_id, current_user.id)
 
     # Update fields if provided
     if course_data.name is not None:
@@ -115,8 +147,8 @@ async def update_course(
     if course_data.icon is not None:
         course.icon = course_data.icon
 
-    course.updated_at = datetime.utcnow()
-    db.commit()
+    # updated_at bumps automatically via onupdate=func.now()
+    await db.commit()
 
     return {"message": "Course updated"}
 
@@ -125,21 +157,16 @@ async def update_course(
 async def delete_course(
     course_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Move course to trash"""
-    course = db.query(Course).filter(
-        Course.id == course_id,
-        Course.user_id == current_user.id
-    ).first()
-
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
+    course = await _get_owned_course(db, course_id, current_user.id)
 
     # Soft delete
+    # Server-side NOW() keeps timestamps consistent across workers
     course.status = 'trash'
-    course.deleted_at = datetime.utcnow()
-    db.commit()
+    course.deleted_at = func.now()
+    await db.commit()
 
     return {"message": "Course moved to trash"}
 
@@ -148,20 +175,13 @@ async def delete_course(
 async def restore_course(
     course_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Restore course from trash"""
-    course = db.query(Course).filter(
-        Course.id == course_id,
-        Course.user_id == current_user.id,
-        Course.status == 'trash'
-    ).first()
-
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found in trash")
+    course = await _get_owned_course(db, course_id, current_user.id, status='trash')
 
     course.status = 'active'
     course.deleted_at = None
-    db.commit()
+    await db.commit()
 
     return {"message": "Course restored"}
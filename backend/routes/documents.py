@@ -1,134 +1,285 @@
 """Document routes"""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from sqlalchemy import exists, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from typing import List
-from datetime import datetime
+import asyncio
+import hashlib
 import logging
 
-from database import get_db
+from cachetools import TTLCache
+
+from database import get_db, AsyncSessionLocal, SessionLocal
 from models import Document, Course, User
 from services.auth_service import get_current_user
-from services.embedding_service import get_embedding_service
+from services.embed_batcher import embed_batcher
 from services.vector_store import get_vector_store
-from schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse, DocumentListItem
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 
-@router.get("/courses/{course_id}/documents", response_model=List[DocumentResponse])
+# Positive ownership results are stable (courses never change hands and are
+# only soft-deleted), so remember them briefly to skip the DB probe while a
+# user browses a course. Misses are never cached: a just-created course must
+# be usable immediately.
+_course_owner_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Related-notes results: the pgvector ANN scan is the most expensive read
+# here and its output only changes when documents change. Writes are rare
+# relative to reads, so any document write just clears the whole cache
+# rather than tracking per-course key sets.
+_related_cache: TTLCache = TTLCache(maxsize=20_000, ttl=300)
+
+
+async def _user_owns_course(db: AsyncSession, course_id: str, user_id) -> bool:
+    """Ownership check via EXISTS - an index-only probe instead of
+    hydrating a full Course row that the caller never reads"""
+    key = (str(course_id), str(user_id))
+    if _course_owner_cache.get(key):
+        return True
+
+    owned = await db.scalar(
+        select(
+            exists().where(
+                Course.id == course_id,
+                Course.user_id == user_id
+            )
+        )
+    )
+    if owned:
+        _course_owner_cache[key] = True
+    return owned
+
+
+def _make_etag(*parts) -> str:
+    """Build a quoted ETag from cheap change markers (ids, timestamps, counts)"""
+    raw = ":".join(str(p) for p in parts).encode()
+    return f'"{hashlib.blake2b(raw, digest_size=8).hexdigest()}"'
+
+
+async def _embed_and_store(document_id: str, text: str):
+    """Generate and persist a document embedding after the response is sent
+
+    Runs as a background task: the write endpoints return as soon as the row
+    is committed instead of waiting out the embedding forward pass.
+    """
+    try:
+        embedding = await embed_batcher.submit(text)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Document).where(Document.id == document_id).values(embedding=embedding)
+            )
+            await session.commit()
+        _related_cache.clear()
+        logger.info(f"Stored embedding for document {document_id}")
+    except Exception as e:
+        logger.error(f"Background embedding failed for document {document_id}: {e}")
+
+
+async def _get_owned_document(
+    db: AsyncSession,
+    document_id: str,
+    user_id,
+    status: str = None,
+    with_text: bool = False
+) -> Document:
+    """Load a document owned by the user, raising 404 if not found
+
+    The text bodies are deferred on the model; pass with_text=True on the
+    paths that return them (deferred columns can't lazy-load on AsyncSession).
+    """
+    stmt = select(Document).where(
+        Document.id == document_id,
+        Document.user_id == user_id
+    )
+    if status is not None:
+        stmt = stmt.where(Document.status == status)
+    if with_text:
+        stmt = stmt.options(
+            undefer(Document.original_text),
+            undefer(Document.formatted_note)
+        )
+
+    result = await db.execute(stmt)
+    document = result.scalar_one_or_none()
+
+    if not document:
+        detail = "Document not found in trash" if status == 'trash' else "Document not found"
+        raise HTTPException(status_code=404, detail=detail)
+
+    return document
+
+
+@router.get("/courses/{course_id}/documents", response_model=List[DocumentListItem])
 async def list_documents_in_course(
     course_id: str,
+    request: Request,
+    response: Response,
     status: str = 'active',
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """List all documents in a course"""
+    """List all documents in a course (metadata only - text bodies via GET /{id})"""
     # Verify course belongs to user
-    course = db.query(Course).filter(
-        Course.id == course_id,
-        Course.user_id == current_user.id
-    ).first()
-
-    if not course:
+    if not await _user_owns_course(db, course_id, current_user.id):
         raise HTTPException(status_code=404, detail="Course not found")
 
-    documents = db.query(Document).filter(
-        Document.course_id == course_id,
-        Document.status == status
-    ).order_by(Document.created_at.desc()).all()
+    # Cache validator: one indexed aggregate decides whether the client's
+    # copy is still current, skipping the row fetch entirely on a 304
+    max_updated, doc_count = (await db.execute(
+        select(func.max(Document.updated_at), func.count(Document.id)).where(
+            Document.course_id == course_id,
+            Document.status == status
+        )
+    )).one()
+    etag = _make_etag(course_id, status, max_updated, doc_count)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    response.headers["ETag"] = etag
+
+    # Lean projection: skip original_text/formatted_note/embedding so the
+    # DB ships kilobytes of metadata instead of megabytes of note bodies
+    result = await db.execute(
+        select(
+            Document.id,
+            Document.course_id,
+            Document.title,
+            Document.excerpt,
+            Document.image_path,
+            Document.status,
+            Document.processing_time,
+            Document.doc_metadata,
+            Document.created_at,
+            Document.updated_at
+        ).where(
+            Document.course_id == course_id,
+            Document.status == status
+        ).order_by(Document.created_at.desc())
+    )
 
+    # model_construct skips first-pass validation: the values come straight
+    # from typed DB columns, and FastAPI validates once more via response_model
     return [
-        DocumentResponse(
-            id=str(doc.id),
-            course_id=str(doc.course_id),
-            title=doc.title,
-            original_text=doc.original_text,
-            formatted_note=doc.formatted_note,
-            excerpt=doc.excerpt,
-            image_path=doc.image_path,
-            status=doc.status,
-            processing_time=doc.processing_time,
-            metadata=doc.doc_metadata,
-            created_at=doc.created_at,
-            updated_at=doc.updated_at
+        DocumentListItem.model_construct(
+            id=str(row.id),
+            course_id=str(row.course_id),
+            title=row.title,
+            excerpt=row.excerpt,
+            image_path=row.image_path,
+            status=row.status,
+            processing_time=row.processing_time,
+            metadata=row.doc_metadata,
+            created_at=row.created_at,
+            updated_at=row.updated_at
         )
-        for doc in documents
+        for row in result.all()
     ]
 
 
 @router.post("/", response_model=dict)
 async def create_document(
     document_data: DocumentCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new document"""
-    # Verify course belongs to user
-    course = db.query(Course).filter(
-        Course.id == document_data.course_id,
-        Course.user_id == current_user.id
-    ).first()
-
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
     # Create excerpt from formatted note if not provided
     excerpt = document_data.excerpt
     if not excerpt and document_data.formatted_note:
         excerpt = document_data.formatted_note[:200]
 
-    # Generate embedding for the formatted note
-    embedding_service = get_embedding_service()
-    try:
-        # Use formatted note for embedding (it's cleaner than original OCR text)
-        embedding = embedding_service.create_embedding(document_data.formatted_note)
-        logger.info(f"Generated embedding for new document: {document_data.title}")
-    except Exception as e:
-        logger.error(f"Failed to generate embedding: {e}")
-        embedding = None
-
-    document = Document(
-        course_id=document_data.course_id,
-        user_id=current_user.id,
-        title=document_data.title,
-        original_text=document_data.original_text,
-        formatted_note=document_data.formatted_note,
-        excerpt=excerpt,
-        image_path=document_data.image_path,
-        processing_time=document_data.processing_time,
-        doc_metadata=document_data.metadata or {},
-        embedding=embedding  # Store the embedding
-    )
-    db.add(document)
-    db.commit()
-    db.refresh(document)
+    # The embedding is filled in by a background task after the response;
+    # the row is usable (and searchable by everything except vector
+    # similarity) immediately
+    embedding = None
+
+    # Single roundtrip: INSERT ... SELECT <values> FROM courses WHERE the
+    # course belongs to the caller. Inserts nothing (and we 404) when the
+    # ownership check fails, instead of a separate SELECT first.
+    columns = [
+        Document.course_id,
+        Document.user_id,
+        Document.title,
+        Document.original_text,
+        Document.formatted_note,
+        Document.excerpt,
+        Document.image_path,
+        Document.processing_time,
+        Document.doc_metadata,
+        Document.embedding,
+    ]
+    values = [
+        document_data.course_id,
+        current_user.id,
+        document_data.title,
+        document_data.original_text,
+        document_data.formatted_note,
+        excerpt,
+        document_data.image_path,
+        document_data.processing_time,
+        document_data.metadata or {},
+        embedding,
+    ]
+    stmt = insert(Document).from_select(
+        columns,
+        select(
+            *[literal(value, col.type) for col, value in zip(columns, values)]
+        ).where(
+            Course.id == document_data.course_id,
+            Course.user_id == current_user.id
+        )
+    ).returning(Document.id)
+
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    await db.commit()
+
+    # Use formatted note for embedding (it's cleaner than original OCR text)
+    background_tasks.add_task(_embed_and_store, str(row.id), document_data.formatted_note)
 
-    return {"id": str(document.id), "title": document.title}
+    return {"id": str(row.id), "title": document_data.title}
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific document"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    # Lean load first (text bodies are deferred): enough to authorize and to
+    # answer 304 without ever pulling the multi-KB note bodies
+    document = await _get_owned_document(db, document_id, current_user.id)
+
+    etag = _make_etag(document.id, document.updated_at)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    response.headers["ETag"] = etag
+
+    # Client copy is stale; fetch the text bodies with one PK probe
+    original_text, formatted_note = (await db.execute(
+        select(Document.original_text, Document.formatted_note).where(
+            Document.id == document.id
+        )
+    )).one()
 
-    return DocumentResponse(
+    # model_construct: the multi-KB text bodies come straight from typed DB
+    # columns, so skip the first validation pass and let FastAPI's single
+    # response_model pass + orjson handle encoding
+    return DocumentResponse.model_construct(
         id=str(document.id),
         course_id=str(document.course_id),
         title=document.title,
-        original_text=document.original_text,
-        formatted_note=document.formatted_note,
+        original_text=original_text,
+        formatted_note=formatted_note,
         excerpt=document.excerpt,
         image_path=document.image_path,
         status=document.status,
@@ -143,45 +294,53 @@ async def get_document(
 async def update_document(
     document_id: str,
     document_data: DocumentUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a document"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    # Update fields if provided
+    values = {}
     if document_data.title is not None:
-        document.title = document_data.title
+        values['title'] = document_data.title
     if document_data.formatted_note is not None:
-        document.formatted_note = document_data.formatted_note
+        values['formatted_note'] = document_data.formatted_note
+    if document_data.course_id is not None:
+        values['course_id'] = document_data.course_id
 
-        # Regenerate embedding when formatted note is updated
-        embedding_service = get_embedding_service()
-        try:
-            new_embedding = embedding_service.create_embedding(document_data.formatted_note)
-            document.embedding = new_embedding
-            logger.info(f"Regenerated embedding for updated document: {document_id}")
-        except Exception as e:
-            logger.error(f"Failed to regenerate embedding: {e}")
+    if not values:
+        # Nothing to write; just confirm the document exists
+        await _get_owned_document(db, document_id, current_user.id)
+        return {"message": "Document updated"}
 
+    # Single roundtrip: ownership and (for moves) target-course checks are
+    # folded into the UPDATE itself; updated_at bumps via onupdate=func.now()
+    stmt = update(Document).where(
+        Document.id == document_id,
+        Document.user_id == current_user.id
+    )
     if document_data.course_id is not None:
-        # Verify new course belongs to user
-        course = db.query(Course).filter(
-            Course.id == document_data.course_id,
-            Course.user_id == current_user.id
-        ).first()
-        if not course:
+        stmt = stmt.where(
+            exists().where(
+                Course.id == document_data.course_id,
+                Course.user_id == current_user.id
+            )
+        )
+    stmt = stmt.values(**values).returning(Document.id)
+
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        # Rare failure path: spend a query to report which check failed
+        if document_data.course_id is not None and not await _user_owns_course(
+            db, document_data.course_id, current_user.id
+        ):
             raise HTTPException(status_code=404, detail="Target course not found")
-        document.course_id = document_data.course_id
+        raise HTTPException(status_code=404, detail="Document not found")
+    await db.commit()
 
-    document.updated_at = datetime.utcnow()
-    db.commit()
+    _related_cache.clear()
+    # Regenerate the embedding off the response path when the note changed
+    if document_data.formatted_note is not None:
+        background_tasks.add_task(_embed_and_store, document_id, document_data.formatted_note)
 
     return {"message": "Document updated"}
 
@@ -190,21 +349,22 @@ async def update_document(
 async def delete_document(
     document_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Move document to trash"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-
-    if not document:
+    # One UPDATE ... RETURNING instead of load-mutate-commit; server-side
+    # NOW() keeps timestamps consistent across workers
+    row = (await db.execute(
+        update(Document).where(
+            Document.id == document_id,
+            Document.user_id == current_user.id
+        ).values(status='trash', deleted_at=func.now()).returning(Document.id)
+    )).first()
+
+    if row is None:
         raise HTTPException(status_code=404, detail="Document not found")
-
-    # Soft delete
-    document.status = 'trash'
-    document.deleted_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    _related_cache.clear()
 
     return {"message": "Document moved to trash"}
 
@@ -213,21 +373,21 @@ async def delete_document(
 async def restore_document(
     document_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Restore document from trash"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id,
-        Document.status == 'trash'
-    ).first()
-
-    if not document:
+    row = (await db.execute(
+        update(Document).where(
+            Document.id == document_id,
+            Document.user_id == current_user.id,
+            Document.status == 'trash'
+        ).values(status='active', deleted_at=None).returning(Document.id)
+    )).first()
+
+    if row is None:
         raise HTTPException(status_code=404, detail="Document not found in trash")
-
-    document.status = 'active'
-    document.deleted_at = None
-    db.commit()
+    await db.commit()
+    _related_cache.clear()
 
     return {"message": "Document restored"}
 
@@ -237,7 +397,7 @@ async def get_related_notes(
     document_id: str,
     top_k: int = 5,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get notes related to a specific document using vector similarity.
@@ -252,20 +412,23 @@ async def get_related_notes(
         List of related notes with id, title, excerpt, similarity score, and created_at
     """
     # Verify document belongs to user
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    # Get related notes using vector store
-    vector_store = get_vector_store()
-    related_notes = vector_store.find_related_notes(
-        db=db,
-        document_id=document_id,
-        top_k=top_k
-    )
-
-    return related_notes
+    await _get_owned_document(db, document_id, current_user.id)
+
+    cache_key = (document_id, top_k)
+    cached = _related_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # The vector store runs on a sync session; execute it on a worker thread
+    # so the similarity search doesn't block the event loop
+    def _find_related():
+        with SessionLocal() as sync_db:
+            return get_vector_store().find_related_notes(
+                db=sync_db,
+                document_id=document_id,
+                top_k=top_k
+            )
+
+    related = await asyncio.to_thread(_find_related)
+    _related_cache[cache_key] = related
+    return related
@@ -1,6 +1,7 @@
 """User profile routes"""
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from models import User
@@ -27,12 +28,14 @@ async def get_user_profile(current_user: User = Depends(get_current_user)):
 async def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user profile"""
     if user_update.name:
-        current_user.name = user_update.name
-
-    db.commit()
+        # Direct UPDATE: skips re-attaching the User row to the session
+        await db.execute(
+            update(User).where(User.id == current_user.id).values(name=user_update.name)
+        )
+        await db.commit()
 
     return {"message": "Profile updated"}
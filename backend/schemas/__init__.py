@@ -7,13 +7,14 @@ from .common import (
     ProcessNoteResponse,
     QAItemResponse,
     KnowledgeCardResponse,
+    KeyConceptResponse,
     RelatedNoteResponse,
     MultiAgentMetadata,
     MultiAgentProcessNoteResponse,
 )
 from .user import UserResponse, UserUpdate
 from .course import CourseCreate, CourseUpdate, CourseResponse
-from .document import DocumentCreate, DocumentUpdate, DocumentResponse
+from .document import DocumentCreate, DocumentUpdate, DocumentResponse, DocumentListItem
 
 __all__ = [
     "HealthResponse",
@@ -23,6 +24,7 @@ __all__ = [
     "ProcessNoteResponse",
     "QAItemResponse",
     "KnowledgeCardResponse",
+    "KeyConceptResponse",
     "RelatedNoteResponse",
     "MultiAgentMetadata",
     "MultiAgentProcessNoteResponse",
@@ -34,4 +36,5 @@ __all__ = [
     "DocumentCreate",
     "DocumentUpdate",
     "DocumentResponse",
+    "DocumentListItem",
 ]
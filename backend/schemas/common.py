@@ -52,6 +52,14 @@ class KnowledgeCardResponse(BaseModel):
     concept: Optional[str] = None
 
 
+class KeyConceptResponse(BaseModel):
+    """Key concept extracted by the structure agent"""
+    term: str
+    definition: Optional[str] = None
+    context: Optional[str] = None
+    importance: float = 1.0
+
+
 class RelatedNoteResponse(BaseModel):
     """Related note from RAG retrieval"""
     document_id: str
@@ -93,7 +101,7 @@ class MultiAgentProcessNoteResponse(BaseModel):
     # Related notes from RAG
     related_notes: list[RelatedNoteResponse] = []
     # Key concepts extracted
-    key_concepts: list[dict] = []
+    key_concepts: list[KeyConceptResponse] = []
     # Processing metadata
     metadata: Optional[MultiAgentMetadata] = None
     # Document ID if saved
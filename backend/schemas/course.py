@@ -1,14 +1,18 @@
 """Course schemas"""
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+from typing import Annotated, Optional
 from datetime import datetime
 
+# Shared constrained type: the pattern is compiled once by pydantic-core and
+# both request models reference the same matcher
+HexColor = Annotated[str, StringConstraints(pattern=r'^#[0-9A-Fa-f]{6}$')]
+
 
 class CourseCreate(BaseModel):
     """Course creation request"""
     name: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
-    color: Optional[str] = Field(None, pattern=r'^#[0-9A-Fa-f]{6}$')
+    color: Optional[HexColor] = None
     icon: Optional[str] = Field(None, max_length=50)
 
 
@@ -16,7 +20,7 @@ class CourseUpdate(BaseModel):
     """Course update request"""
     name: Optional[str] = Field(None, min_length=1, max_length=255)
     description: Optional[str] = None
-    color: Optional[str] = Field(None, pattern=r'^#[0-9A-Fa-f]{6}$')
+    color: Optional[HexColor] = None
     icon: Optional[str] = Field(None, max_length=50)
 
 
@@ -32,5 +36,4 @@ class CourseResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
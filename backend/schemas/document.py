@@ -1,5 +1,5 @@
 """Document schemas"""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -23,6 +23,26 @@ class DocumentUpdate(BaseModel):
     course_id: Optional[str] = None  # For moving documents
 
 
+class DocumentListItem(BaseModel):
+    """Document list entry - omits the heavy text bodies
+
+    List views only need metadata and the excerpt; original_text and
+    formatted_note are fetched per document via GET /api/documents/{id}.
+    """
+    id: str
+    course_id: str
+    title: str
+    excerpt: Optional[str] = None
+    image_path: Optional[str] = None
+    status: str
+    processing_time: Optional[float] = None
+    metadata: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class DocumentResponse(BaseModel):
     """Document response"""
     id: str
@@ -38,5 +58,4 @@ class DocumentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
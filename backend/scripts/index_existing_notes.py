@@ -83,18 +83,14 @@ def index_existing_notes(batch_size: int = 10, limit: int = None):
                     # Generate embeddings for batch
                     embeddings = embedding_service.create_embeddings_batch(texts)
 
-                    # Update each document
-                    for doc, embedding in zip(batch, embeddings):
-                        try:
-                            doc.embedding = embedding
-                            db.add(doc)
-                            success_count += 1
-                        except Exception as e:
-                            logger.error(f"Error updating document {doc.id}: {e}")
-                            error_count += 1
-
-                    # Commit batch
-                    db.commit()
+                    # One batched UPDATE round-trip + commit for the whole
+                    # batch instead of per-document statements
+                    updated = vector_store.bulk_update_embeddings(
+                        db,
+                        [(doc.id, embedding) for doc, embedding in zip(batch, embeddings)]
+                    )
+                    success_count += updated
+                    error_count += len(batch) - updated
                     logger.debug(f"Committed batch {i//batch_size + 1}")
 
                 except Exception as e:
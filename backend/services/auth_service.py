@@ -2,10 +2,15 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import asyncio
+import hashlib
+import time
 import requests
+from cachetools import TTLCache
 from datetime import datetime
+from threading import Lock
 
 from config import settings
 from database import get_db
@@ -14,34 +19,108 @@ from models import User
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
+# Verification parameters are fixed for the process lifetime; resolve
+# them once at import instead of re-reading settings and formatting the
+# issuer URL on every token
+_ISSUER = f'https://{settings.auth0_domain}/'
+_AUDIENCE = settings.auth0_audience
+_ALGORITHMS = tuple(settings.auth0_algorithms)
+
+# Verified-token cache: RSA signature checks cost real CPU and run on every
+# request, but a token that verified a moment ago will verify again. Cache
+# the decoded payload for 5 minutes, keyed by a short digest of the raw
+# token (tokens themselves stay out of memory dumps). Trade-off: a revoked
+# token is honored for up to the TTL, which matches Auth0's own guidance.
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_token_cache_lock = Lock()
+
+# JWKS cache: Auth0 rotates signing keys on the order of hours/days, so
+# there is no reason to pay a TLS round-trip per verification. Keyed by
+# domain so environments pointing at different tenants never collide.
+# An unknown kid invalidates the entry and refetches once (key rotation).
+_jwks_cache: TTLCache = TTLCache(maxsize=2, ttl=3600)
+_jwks_cache_lock = Lock()
+
+# last_login_at throttle: the field only conveys coarse login recency,
+# so writing it once per user per 5 minutes is enough. Without this,
+# every authenticated request pays a commit (WAL fsync) just to bump
+# the timestamp.
+_last_login_written: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_last_login_lock = Lock()
+
+
+def _get_cached_payload(cache_key: bytes) -> Optional[dict]:
+    """Look up a cached token payload, dropping it if the token expired.
+
+    The cache TTL (5 min) can outlive a token's own exp claim, so a hit
+    is only valid while the token itself still is.
+    """
+    with _token_cache_lock:
+        payload = _token_cache.get(cache_key)
+
+    if payload is not None and payload.get('exp', 0) <= time.time():
+        with _token_cache_lock:
+            _token_cache.pop(cache_key, None)
+        return None
+
+    return payload
+
 
 def get_jwks():
-    """Fetch Auth0 public keys for JWT verification"""
+    """Fetch Auth0 public keys for JWT verification (uncached)"""
     jwks_url = f'https://{settings.auth0_domain}/.well-known/jwks.json'
     response = requests.get(jwks_url)
     response.raise_for_status()
     return response.json()
 
 
+def _get_rsa_keys(force_refresh: bool = False) -> dict:
+    """Get the kid -> RSA key mapping, cached for 1 hour.
+
+    The per-kid key dicts jwt.decode needs are precomputed once per JWKS
+    refresh, so verification is a plain dict lookup instead of a scan
+    over jwks['keys'] on every call.
+    """
+    cache_key = settings.auth0_domain
+    if not force_refresh:
+        with _jwks_cache_lock:
+            cached = _jwks_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    jwks = get_jwks()
+    rsa_keys = {
+        key['kid']: {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
+        for key in jwks['keys']
+    }
+
+    with _jwks_cache_lock:
+        _jwks_cache[cache_key] = rsa_keys
+    return rsa_keys
+
+
 def verify_token(token: str) -> dict:
     """Verify Auth0 JWT token"""
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached_payload = _get_cached_payload(cache_key)
+    if cached_payload is not None:
+        return cached_payload
+
     try:
         # Get public key from Auth0
-        jwks = get_jwks()
-        unverified_header = jwt.get_unverified_header(token)
-
-        # Find the right key
-        rsa_key = {}
-        for key in jwks['keys']:
-            if key['kid'] == unverified_header['kid']:
-                rsa_key = {
-                    'kty': key['kty'],
-                    'kid': key['kid'],
-                    'use': key['use'],
-                    'n': key['n'],
-                    'e': key['e']
-                }
-                break
+        kid = jwt.get_unverified_header(token)['kid']
+
+        # An unknown kid may mean Auth0 rotated keys since we cached the
+        # JWKS, so refetch once before giving up
+        rsa_key = _get_rsa_keys().get(kid)
+        if not rsa_key:
+            rsa_key = _get_rsa_keys(force_refresh=True).get(kid)
 
         if not rsa_key:
             raise HTTPException(status_code=401, detail="Unable to find appropriate key")
@@ -50,11 +129,14 @@ def verify_token(token: str) -> dict:
         payload = jwt.decode(
             token,
             rsa_key,
-            algorithms=settings.auth0_algorithms,
-            audience=settings.auth0_audience,
-            issuer=f'https://{settings.auth0_domain}/'
+            algorithms=_ALGORITHMS,
+            audience=_AUDIENCE,
+            issuer=_ISSUER
         )
 
+        with _token_cache_lock:
+            _token_cache[cache_key] = payload
+
         return payload
 
     except JWTError as e:
@@ -63,29 +145,55 @@ def verify_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
 
 
+async def _verify_token_async(token: str) -> dict:
+    """Verify a token without blocking the event loop.
+
+    The common case — a token seen within the last 5 minutes — resolves
+    inline from the cache with zero I/O. Misses (JWKS fetch on a cold
+    cache plus the RSA signature check) run in a worker thread so other
+    requests on the loop keep being served meanwhile.
+    """
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached_payload = _get_cached_payload(cache_key)
+    if cached_payload is not None:
+        return cached_payload
+
+    return await asyncio.to_thread(verify_token, token)
+
+
+async def _record_login(db: AsyncSession, user: User) -> None:
+    """Bump last_login_at, at most once per user per throttle window"""
+    with _last_login_lock:
+        if user.id in _last_login_written:
+            return
+        _last_login_written[user.id] = True
+
+    user.last_login_at = datetime.utcnow()
+    await db.commit()
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get current user from Auth0 token"""
     token = credentials.credentials
 
     # Verify Auth0 token
-    auth0_user = verify_token(token)
+    auth0_user = await _verify_token_async(token)
 
     # Get or create user in our database
-    user = User.get_or_create_from_auth0(db, auth0_user)
+    user = await User.get_or_create_from_auth0(db, auth0_user)
 
-    # Update last login
-    user.last_login_at = datetime.utcnow()
-    db.commit()
+    # Update last login (throttled)
+    await _record_login(db, user)
 
     return user
 
 
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """Get current user from Auth0 token (optional - returns None if no token)"""
     if not credentials:
@@ -95,14 +203,13 @@ async def get_current_user_optional(
         token = credentials.credentials
 
         # Verify Auth0 token
-        auth0_user = verify_token(token)
+        auth0_user = await _verify_token_async(token)
 
         # Get or create user in our database
-        user = User.get_or_create_from_auth0(db, auth0_user)
+        user = await User.get_or_create_from_auth0(db, auth0_user)
 
-        # Update last login
-        user.last_login_at = datetime.utcnow()
-        db.commit()
+        # Update last login (throttled)
+        await _record_login(db, user)
 
         return user
     except Exception:
@@ -0,0 +1,97 @@
+"""
+In-process request batching for the OCR and LLM hot paths.
+
+Concurrent uploads used to serialize through the OCR and LLM services one
+request at a time. A RequestBatcher lets each request enqueue its payload and
+await a Future, while a single background worker drains the queue and submits
+one batched call for up to max_batch_size items (waiting at most max_wait_ms
+for stragglers). Single-item "batches" fall through with no extra latency
+beyond the debounce window.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestBatcher:
+    """
+    Coalesces concurrent requests into batched calls to a backing service.
+
+    The batch function receives a list of payloads and must return a list of
+    results of the same length and order. A result may be an Exception
+    instance, in which case it is raised to that item's caller only.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        max_wait_ms: int = 20,
+        name: str = "batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background worker (call from app lifespan startup)"""
+        if self._worker_task is None:
+            self._worker_task = asyncio.create_task(self._worker())
+            logger.info(f"[{self.name}] Batch worker started")
+
+    async def stop(self):
+        """Stop the background worker (call from app lifespan shutdown)"""
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+            logger.info(f"[{self.name}] Batch worker stopped")
+
+    async def submit(self, item: Any) -> Any:
+        """Enqueue a payload and wait for its result from the next batch"""
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect_batch(self) -> List:
+        """Wait for one item, then drain more until full or the window closes"""
+        batch = [await self._queue.get()]
+
+        deadline = asyncio.get_running_loop().time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._collect_batch()
+            items = [item for item, _ in batch]
+
+            try:
+                results = await self.batch_fn(items)
+            except Exception as e:
+                logger.error(f"[{self.name}] Batch of {len(items)} failed: {e}")
+                results = [e] * len(items)
+
+            for (_, future), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
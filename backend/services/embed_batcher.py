@@ -0,0 +1,34 @@
+"""
+Dynamic batching for sentence-transformer embedding requests.
+
+Each HTTP request used to pay a full forward pass for its single text.
+Routing every embedding through a shared RequestBatcher lets concurrent
+writes coalesce into one create_embeddings_batch call, which the model
+executes far more efficiently than the same texts one at a time. At low
+load a request waits at most the debounce window (10ms) and runs alone.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+from services.batcher import RequestBatcher
+from services.embedding_service import get_embedding_service
+
+# Dedicated pool sized to the model's real concurrency: extra threads just
+# contend for the same weights, and isolating them keeps a long encode from
+# occupying asyncio.to_thread's shared default executor
+_embed_executor = ThreadPoolExecutor(
+    max_workers=settings.embed_worker_threads, thread_name_prefix="embed"
+)
+
+
+async def _embed_batch(texts):
+    # The ndarray form flows straight through to pgvector (HALFVEC accepts
+    # ndarrays) without boxing 384 floats per vector into a Python list
+    service = get_embedding_service()
+    return await asyncio.get_running_loop().run_in_executor(
+        _embed_executor, service.create_embeddings_batch_np, texts
+    )
+
+
+embed_batcher = RequestBatcher(_embed_batch, max_batch_size=32, max_wait_ms=10, name="embed")
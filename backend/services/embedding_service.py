@@ -3,13 +3,31 @@ Embedding service for generating vector representations of documents.
 Uses sentence-transformers for multilingual text embeddings.
 """
 from sentence_transformers import SentenceTransformer
+from cachetools import LRUCache
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+import atexit
+import hashlib
 import logging
 import numpy as np
 from typing import List, Dict, Optional
 import re
 
+from config import settings
+
 logger = logging.getLogger(__name__)
 
+# Embedding memo keyed by content hash: identical text (re-saves, retries,
+# reprocessing an unchanged note) skips the transformer forward pass
+# entirely. ~1k entries of 384-dim vectors stay well under 20 MB.
+_embedding_cache: LRUCache = LRUCache(maxsize=1024)
+_embedding_cache_lock = Lock()
+
+# Markdown header pattern (## or ###), compiled once instead of re-parsed
+# per document
+_HEADER_RE = re.compile(r'\n(#{1,3})\s+(.+?)\n')
+
 
 class EmbeddingService:
     """Singleton service for generating text embeddings"""
@@ -18,17 +36,81 @@ class EmbeddingService:
     MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
     EMBEDDING_DIM = 384  # Dimension of the embedding vectors
     MAX_CHUNK_LENGTH = 512  # Maximum tokens per chunk
+    # Batches below this size aren't worth the IPC round-trip to the
+    # multi-process pool; encode them in-process
+    POOL_MIN_BATCH = 32
 
     def __init__(self):
         """Initialize the sentence transformer model"""
         try:
             logger.info(f"Loading embedding model: {self.MODEL_NAME}")
-            self.model = SentenceTransformer(self.MODEL_NAME)
+            self.model = self._load_model()
+            self.pool = self._start_pool()
             logger.info(f"Embedding model loaded successfully (dim={self.EMBEDDING_DIM})")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise
 
+    def _start_pool(self) -> Optional[dict]:
+        """Optionally start a multi-process encoding pool.
+
+        Opt-in via EMBEDDING_POOL_WORKERS: each worker process holds its own
+        copy of the model, so this only pays off on multi-core hosts that
+        regularly embed large documents (many chunks per batch). The pool is
+        persistent and torn down at interpreter exit.
+        """
+        workers = settings.embedding_pool_workers
+        if workers <= 1:
+            return None
+
+        try:
+            pool = self.model.start_multi_process_pool(
+                target_devices=["cpu"] * workers
+            )
+            atexit.register(self.model.stop_multi_process_pool, pool)
+            logger.info(f"Started embedding pool with {workers} worker processes")
+            return pool
+        except Exception as e:
+            logger.warning(f"Embedding pool unavailable ({e}); encoding in-process")
+            return None
+
+    def _load_model(self) -> SentenceTransformer:
+        """Load the encoder, preferring an INT8-quantized ONNX export.
+
+        The quantized graph runs the MatMuls on int8 GEMM kernels, cutting
+        encode latency 2-4x on CPU. The export is built once and cached on
+        disk; any failure (missing optimum/onnxruntime, unsupported CPU)
+        falls back to the stock PyTorch model so startup never breaks.
+        """
+        if settings.embedding_backend != "onnx":
+            return SentenceTransformer(self.MODEL_NAME)
+
+        try:
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            cache_dir = (
+                Path.home() / ".cache" / "snapnote"
+                / f"{self.MODEL_NAME}-onnx-qint8"
+            )
+            quantized_file = "onnx/model_qint8_avx512_vnni.onnx"
+
+            if not (cache_dir / quantized_file).exists():
+                logger.info("Exporting INT8 ONNX embedding model (one-time)...")
+                model = SentenceTransformer(self.MODEL_NAME, backend="onnx")
+                model.save_pretrained(str(cache_dir))
+                export_dynamic_quantized_onnx_model(
+                    model, "avx512_vnni", str(cache_dir)
+                )
+
+            return SentenceTransformer(
+                str(cache_dir),
+                backend="onnx",
+                model_kwargs={"file_name": quantized_file},
+            )
+        except Exception as e:
+            logger.warning(f"ONNX backend unavailable ({e}); using PyTorch backend")
+            return SentenceTransformer(self.MODEL_NAME)
+
     def create_embedding(self, text: str) -> List[float]:
         """
         Generate embedding vector for a single text.
@@ -43,20 +125,68 @@ class EmbeddingService:
             logger.warning("Empty text provided for embedding")
             return [0.0] * self.EMBEDDING_DIM
 
-        try:
-            # Generate embedding
-            embedding = self.model.encode(text, convert_to_numpy=True)
+        # Single path through the batch encode — callers that need to
+        # coalesce concurrent single-item requests go through embed_batcher
+        return self.create_embeddings_batch([text])[0]
+
+    @staticmethod
+    def _quantize(embedding: np.ndarray) -> np.ndarray:
+        """
+        Normalize and quantize an embedding to a float16 ndarray.
+
+        The vectors are stored in a pgvector halfvec(384) column, so rounding
+        to float16 here keeps the stored values exact while halving the
+        payload sent to the database (<1% recall loss for cosine search).
+        A float16 ndarray is also ~14x smaller than the equivalent list of
+        PyFloat objects (768 bytes vs ~11 KB), so internal callers and the
+        cache stay on the ndarray form; `.tolist()` happens only at the
+        public List[float] boundary.
+        """
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec.astype(np.float16)
+
+    def create_embeddings_batch_np(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings as normalized float16 ndarrays.
+
+        This is the preferred form for internal consumers: pgvector accepts
+        ndarrays directly and vector math stays unboxed, so only JSON
+        serialization ever needs the List[float] wrapper.
+        """
+        if not texts:
+            return []
 
-            # Ensure it's a list of floats
-            embedding_list = embedding.tolist()
+        # Filter out empty texts
+        valid_texts = [t if t and t.strip() else " " for t in texts]
 
-            logger.debug(f"Generated embedding for text (length={len(text)})")
-            return embedding_list
+        try:
+            # Serve content-hash cache hits and only encode the misses
+            keys = [hashlib.blake2b(t.encode(), digest_size=16).digest() for t in valid_texts]
+            with _embedding_cache_lock:
+                results = [_embedding_cache.get(k) for k in keys]
+
+            miss_indices = [i for i, r in enumerate(results) if r is None]
+            if miss_indices:
+                miss_texts = [valid_texts[i] for i in miss_indices]
+                if self.pool is not None and len(miss_texts) >= self.POOL_MIN_BATCH:
+                    # Shard large batches across the worker processes;
+                    # tokenization and encoding run truly in parallel there
+                    embeddings = self.model.encode_multi_process(
+                        miss_texts, self.pool, batch_size=64
+                    )
+                else:
+                    embeddings = self.model.encode(miss_texts, convert_to_numpy=True)
+                with _embedding_cache_lock:
+                    for i, e in zip(miss_indices, embeddings):
+                        results[i] = _embedding_cache[keys[i]] = self._quantize(e)
 
+            return results
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
-            # Return zero vector on error
-            return [0.0] * self.EMBEDDING_DIM
+            logger.error(f"Error generating batch embeddings: {e}")
+            return [np.zeros(self.EMBEDDING_DIM, dtype=np.float16)] * len(texts)
 
     def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """
@@ -68,18 +198,7 @@ class EmbeddingService:
         Returns:
             List of embedding vectors
         """
-        if not texts:
-            return []
-
-        # Filter out empty texts
-        valid_texts = [t if t and t.strip() else " " for t in texts]
-
-        try:
-            embeddings = self.model.encode(valid_texts, convert_to_numpy=True)
-            return embeddings.tolist()
-        except Exception as e:
-            logger.error(f"Error generating batch embeddings: {e}")
-            return [[0.0] * self.EMBEDDING_DIM] * len(texts)
+        return [e.tolist() for e in self.create_embeddings_batch_np(texts)]
 
     def chunk_text_by_headers(self, markdown_text: str) -> List[Dict[str, str]]:
         """
@@ -92,65 +211,51 @@ class EmbeddingService:
         Returns:
             List of chunks with metadata
         """
-        chunks = []
+        valid_chunks = []
+        max_len = self.MAX_CHUNK_LENGTH * 4  # ~2000 chars
+
+        def emit(content: str, header: Optional[str], level: int) -> None:
+            """Collect a chunk, splitting it further if it is too long"""
+            if not content:
+                return
+            if len(content) > max_len:
+                valid_chunks.extend(self._split_long_chunk(content, header))
+            else:
+                valid_chunks.append({
+                    'content': content,
+                    'header': header,
+                    'level': level
+                })
 
-        # Split by markdown headers (## or ###)
-        sections = re.split(r'\n(#{1,3})\s+(.+?)\n', markdown_text)
+        # Walk the header positions (## or ###) and slice the source text
+        # between them, instead of materializing a full re.split list
+        matches = list(_HEADER_RE.finditer(markdown_text))
 
-        if len(sections) == 1:
+        if not matches:
             # No headers found, treat as single chunk
-            if markdown_text.strip():
-                chunks.append({
-                    'content': markdown_text.strip(),
-                    'header': None,
-                    'level': 0
-                })
+            emit(markdown_text.strip(), None, 0)
         else:
-            current_content = sections[0].strip() if sections[0].strip() else None
-
-            # Process header groups
-            for i in range(1, len(sections), 3):
-                if i + 2 <= len(sections):
-                    header_marks = sections[i]
-                    header_text = sections[i + 1]
-                    section_content = sections[i + 2] if i + 2 < len(sections) else ""
-
-                    # Add previous content if exists
-                    if current_content:
-                        chunks.append({
-                            'content': current_content,
-                            'header': None,
-                            'level': 0
-                        })
-
-                    # Add section with header
-                    full_content = f"{header_marks} {header_text}\n{section_content}".strip()
-                    chunks.append({
-                        'content': full_content,
-                        'header': header_text,
-                        'level': len(header_marks)
-                    })
-
-                    current_content = None
-
-            # Add any remaining content
-            if current_content:
-                chunks.append({
-                    'content': current_content,
-                    'header': None,
-                    'level': 0
-                })
-
-        # Filter out empty chunks and limit size
-        valid_chunks = []
-        for chunk in chunks:
-            if chunk['content']:
-                # If chunk is too long, split it further
-                if len(chunk['content']) > self.MAX_CHUNK_LENGTH * 4:  # ~2000 chars
-                    sub_chunks = self._split_long_chunk(chunk['content'], chunk['header'])
-                    valid_chunks.extend(sub_chunks)
-                else:
-                    valid_chunks.append(chunk)
+            # Content before the first header
+            emit(markdown_text[:matches[0].start()].strip(), None, 0)
+
+            for i, match in enumerate(matches):
+                header_marks, header_text = match.group(1), match.group(2)
+                section_end = (
+                    matches[i + 1].start() if i + 1 < len(matches)
+                    else len(markdown_text)
+                )
+                section_content = markdown_text[match.end():section_end]
+
+                # rstrip the tail before concatenating — stripping the
+                # assembled f-string would copy the whole section a second
+                # time, and the head can't have leading whitespace (it
+                # starts with the header marks)
+                tail = section_content.rstrip()
+                full_content = (
+                    f"{header_marks} {header_text}\n{tail}" if tail
+                    else f"{header_marks} {header_text}".rstrip()
+                )
+                emit(full_content, header_text, len(header_marks))
 
         logger.info(f"Split text into {len(valid_chunks)} chunks")
         return valid_chunks
@@ -167,28 +272,46 @@ class EmbeddingService:
             List of smaller chunks
         """
         chunks = []
-        paragraphs = text.split('\n\n')
+        max_len = self.MAX_CHUNK_LENGTH * 4
+        level = 2 if header else 0
+
+        def flush(start: int, end: int) -> None:
+            content = text[start:end].strip()
+            if content:
+                chunks.append({
+                    'content': content,
+                    'header': header,
+                    'level': level
+                })
 
-        current_chunk = ""
-        for para in paragraphs:
-            if len(current_chunk) + len(para) < self.MAX_CHUNK_LENGTH * 4:
-                current_chunk += para + "\n\n"
+        # Walk paragraph boundaries by offset and only materialize each
+        # chunk's substring once, instead of growing a string with += per
+        # paragraph (quadratic on long sections)
+        chunk_start = 0      # start of the chunk being accumulated
+        chunk_end = 0        # end of the last paragraph taken into it
+        current_len = 0      # tracked as len(paragraph) + 2 per paragraph
+        pos = 0
+        n = len(text)
+
+        while pos <= n:
+            sep = text.find('\n\n', pos)
+            para_end = sep if sep != -1 else n
+            para_len = para_end - pos
+
+            if current_len == 0 or current_len + para_len < max_len:
+                chunk_end = para_end
+                current_len += para_len + 2
             else:
-                if current_chunk.strip():
-                    chunks.append({
-                        'content': current_chunk.strip(),
-                        'header': header,
-                        'level': 2 if header else 0
-                    })
-                current_chunk = para + "\n\n"
-
-        # Add remaining content
-        if current_chunk.strip():
-            chunks.append({
-                'content': current_chunk.strip(),
-                'header': header,
-                'level': 2 if header else 0
-            })
+                flush(chunk_start, chunk_end)
+                chunk_start = pos
+                chunk_end = para_end
+                current_len = para_len + 2
+
+            if sep == -1:
+                break
+            pos = sep + 2
+
+        flush(chunk_start, chunk_end)
 
         return chunks
 
@@ -213,21 +336,22 @@ class EmbeddingService:
             if not chunks:
                 return [0.0] * self.EMBEDDING_DIM
 
-            # Get embeddings for all chunks
+            # Get embeddings for all chunks on the ndarray path — averaging
+            # float16 rows directly avoids materializing a list-of-lists of
+            # PyFloat objects just to tear it back down into an array
             chunk_texts = [c['content'] for c in chunks]
-            embeddings = self.create_embeddings_batch(chunk_texts)
-
-            # Average the embeddings
-            avg_embedding = np.mean(embeddings, axis=0)
-            return avg_embedding.tolist()
+            embeddings = self.create_embeddings_batch_np(chunk_texts)
 
+            # Average in float32 (summing raw float16 would lose precision)
+            # and quantize the result so the chunked path stores the same
+            # normalized halfvec form as the single-pass path
+            avg_embedding = np.stack(embeddings).astype(np.float32).mean(axis=0)
+            return self._quantize(avg_embedding).tolist()
 
-# Singleton instance
-_embedding_service = None
 
+# Singleton accessor - lru_cache guarantees the model is loaded exactly once
+# per process and reused across all requests
+@lru_cache(maxsize=1)
 def get_embedding_service() -> EmbeddingService:
     """Get or create the singleton embedding service instance"""
-    global _embedding_service
-    if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-    return _embedding_service
+    return EmbeddingService()
@@ -1,4 +1,5 @@
 import anthropic
+import httpx
 from config import settings
 import logging
 from typing import List, Dict, Optional
@@ -6,9 +7,29 @@ from typing import List, Dict, Optional
 logger = logging.getLogger(__name__)
 
 class LLMService:
+    # RAG 历史上下文的 token 预算（粗略估计值）
+    RAG_CONTEXT_TOKEN_BUDGET = 2000
+
     def __init__(self):
         """初始化 Claude 客户端"""
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        # 复用一个长连接池：省去每次调用的 TLS 握手；HTTP/2 多路复用让
+        # 并发的 LLM 请求共享同一条连接（需要 h2 包，缺失时退回 HTTP/1.1）
+        try:
+            http_client = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            )
+        except ImportError:
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            )
+
+        self.client = anthropic.Anthropic(
+            api_key=settings.anthropic_api_key,
+            http_client=http_client,
+        )
         self.model = "claude-sonnet-4-20250514"  # 使用最新的 Sonnet 4.5
     
     def format_note(self, ocr_text: str, additional_context: str = None) -> str:
@@ -46,25 +67,33 @@ class LLMService:
 输出纯 Markdown 格式，不要添加任何解释性文字。"""
 
         # 构建用户提示词
-        user_prompt = f"""请整理以下课堂笔记的 OCR 文本：
+        # 额外上下文放在 OCR 文本之前：同一课程的重复上下文与系统提示词
+        # 组成共享前缀，可被 prompt cache 复用
+        user_prompt = ""
+        if additional_context:
+            user_prompt += f"额外上下文：{additional_context}\n\n"
+
+        user_prompt += f"""请整理以下课堂笔记的 OCR 文本：
 
 ```
 {ocr_text}
 ```
-"""
-        
-        if additional_context:
-            user_prompt += f"\n\n额外上下文：{additional_context}\n"
-        
-        user_prompt += "\n请输出整理后的笔记（Markdown 格式）："
-        
+
+请输出整理后的笔记（Markdown 格式）："""
+
         try:
-            # 调用 Claude API
+            # 调用 Claude API（固定系统提示词标记为可缓存，跳过重复 prefill）
             message = self.client.messages.create(
                 model=self.model,
                 max_tokens=4096,
                 temperature=0.3,  # 较低的温度以保持一致性
-                system=system_prompt,
+                system=[
+                    {
+                        "type": "text",
+                        "text": system_prompt,
+                        "cache_control": {"type": "ephemeral"}
+                    }
+                ],
                 messages=[
                     {"role": "user", "content": user_prompt}
                 ]
@@ -135,29 +164,46 @@ class LLMService:
 
 输出纯 Markdown 格式的整理笔记。"""
 
-        # 构建用户提示词
-        user_prompt = f"""**课程名称**：{course_name}
+        # 构建用户提示词：历史上下文块与新笔记块分开，
+        # 历史块在同一门课程的连续上传之间保持不变，可被 prompt cache 复用
+        context_prompt = f"""**课程名称**：{course_name}
 
 """
 
-        # 添加历史笔记上下文（如果有）
+        # 添加历史笔记上下文（如果有）：按相似度从高到低贪心打包，
+        # 直到 token 预算用完，避免低相关条目白白消耗 prompt 长度
         if historical_context and len(historical_context) > 0:
-            user_prompt += "**相关历史笔记**（供参考，了解课程脉络）：\n\n"
-            for i, ctx in enumerate(historical_context, 1):
+            ordered = sorted(
+                historical_context, key=lambda c: c['similarity'], reverse=True
+            )
+            parts = ["**相关历史笔记**（供参考，了解课程脉络）：\n\n"]
+            budget = self.RAG_CONTEXT_TOKEN_BUDGET
+
+            for i, ctx in enumerate(ordered, 1):
                 similarity_pct = int(ctx['similarity'] * 100)
-                user_prompt += f"### 历史笔记 {i}：{ctx['title']} \n"
-                user_prompt += f"*日期: {ctx['created_at']} | 相关度: {similarity_pct}%*\n\n"
 
                 # 限制历史笔记长度，避免 prompt 过长
                 content_preview = ctx['content'][:800]
                 if len(ctx['content']) > 800:
                     content_preview += "\n...(内容已截断)"
 
-                user_prompt += f"{content_preview}\n\n"
-                user_prompt += "---\n\n"
+                entry = (
+                    f"### 历史笔记 {i}：{ctx['title']} \n"
+                    f"*日期: {ctx['created_at']} | 相关度: {similarity_pct}%*\n\n"
+                    f"{content_preview}\n\n---\n\n"
+                )
+
+                # 中英混排的粗略 token 估计；最相关的一条始终保留
+                est_tokens = len(entry) // 3
+                if est_tokens > budget and len(parts) > 1:
+                    break
+                budget -= est_tokens
+                parts.append(entry)
+
+            context_prompt += "".join(parts)
 
-        # 添加新笔记 OCR 文本
-        user_prompt += f"""**新上传的笔记**（OCR 识别文本）：
+        # 新笔记 OCR 文本（每次都不同，不参与缓存）
+        new_note_prompt = f"""**新上传的笔记**（OCR 识别文本）：
 
 ```
 {ocr_text}
@@ -165,9 +211,9 @@ class LLMService:
 """
 
         if additional_context:
-            user_prompt += f"\n\n**额外上下文**：{additional_context}\n"
+            new_note_prompt += f"\n\n**额外上下文**：{additional_context}\n"
 
-        user_prompt += """
+        new_note_prompt += """
 
 **任务**：
 1. 整理新笔记为结构化 Markdown
@@ -178,23 +224,42 @@ class LLMService:
 请输出整理后的笔记（Markdown 格式）："""
 
         try:
-            # 调用 Claude API
+            # 调用 Claude API（系统提示词与历史上下文块均标记为可缓存，
+            # 同一课程的重复查询跳过这部分的 prefill）
             message = self.client.messages.create(
                 model=self.model,
                 max_tokens=4096,
                 temperature=0.3,  # 较低的温度以保持一致性
-                system=system_prompt,
+                system=[
+                    {
+                        "type": "text",
+                        "text": system_prompt,
+                        "cache_control": {"type": "ephemeral"}
+                    }
+                ],
                 messages=[
-                    {"role": "user", "content": user_prompt}
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": context_prompt,
+                                "cache_control": {"type": "ephemeral"}
+                            },
+                            {"type": "text", "text": new_note_prompt}
+                        ]
+                    }
                 ]
             )
 
             # 提取响应文本
             formatted_note = message.content[0].text
 
+            cache_read = getattr(message.usage, "cache_read_input_tokens", 0) or 0
             logger.info(
                 f"RAG 增强整理成功 - 输入: {len(ocr_text)} 字符, "
                 f"历史上下文: {len(historical_context) if historical_context else 0} 篇, "
+                f"缓存命中: {cache_read} tokens, "
                 f"输出: {len(formatted_note)} 字符"
             )
             return formatted_note
@@ -0,0 +1,40 @@
+"""
+Content-hash cache for OCR results.
+
+Re-uploads of the same image (retries, duplicate scans of a page) used to
+re-run the full OCR pipeline. Hashing the raw upload takes ~1-3 ms for a
+typical phone photo - an order of magnitude under OCR cost - so caching
+(text, confidence) by SHA-256 makes duplicate uploads near-free.
+"""
+import hashlib
+import logging
+from threading import Lock
+from typing import Optional, Tuple
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# ~10k entries of (text, confidence); bounded so memory stays modest
+_cache: LRUCache = LRUCache(maxsize=10_000)
+_lock = Lock()
+
+
+def cache_key(image_bytes: bytes) -> bytes:
+    """Compute the cache key for an uploaded image"""
+    return hashlib.sha256(image_bytes).digest()
+
+
+def get(key: bytes) -> Optional[Tuple[str, float]]:
+    """Look up a cached (text, confidence) result, or None on miss"""
+    with _lock:
+        result = _cache.get(key)
+    if result is not None:
+        logger.info("OCR cache hit")
+    return result
+
+
+def put(key: bytes, result: Tuple[str, float]) -> None:
+    """Store an OCR result for future identical uploads"""
+    with _lock:
+        _cache[key] = result
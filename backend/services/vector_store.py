@@ -2,9 +2,13 @@
 Vector store service for RAG (Retrieval-Augmented Generation) operations.
 Handles semantic search using pgvector and course-level context retrieval.
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, func, text, update
+from sqlalchemy.orm import Session, undefer
+from threading import Lock
 from typing import List, Dict, Optional, Tuple
 import logging
+import numpy as np
+import time
 from uuid import UUID
 
 from models.document import Document
@@ -12,14 +16,105 @@ from models.course import Course
 
 logger = logging.getLogger(__name__)
 
+# Source lookup and neighbor search fused into one statement, saving a
+# round-trip and the shipping of the 384-dim source embedding to Python and
+# back. The source vector is referenced through uncorrelated scalar
+# subqueries, which the planner evaluates once as InitPlans — keeping the
+# ORDER BY in the constant-vector form the HNSW index requires (a plain
+# join against the CTE would force a sequential scan).
+_RELATED_NOTES_SQL = text("""
+    WITH src AS (
+        SELECT embedding, course_id
+        FROM documents
+        WHERE id = :doc_id AND status = 'active' AND embedding IS NOT NULL
+    )
+    SELECT d.id, d.title, d.excerpt, d.formatted_note, d.created_at,
+           1 - (d.embedding <=> (SELECT embedding FROM src)) AS similarity
+    FROM documents d
+    WHERE d.course_id = (SELECT course_id FROM src)
+      AND d.id <> :doc_id
+      AND d.status = 'active'
+      AND d.embedding IS NOT NULL
+      AND d.embedding <=> (SELECT embedding FROM src) <= :max_distance
+    ORDER BY d.embedding <=> (SELECT embedding FROM src)
+    LIMIT :top_k
+""")
+
 
 class VectorStoreService:
     """Service for vector-based document retrieval and similarity search"""
 
+    # Semantic result cache: RAG traffic has strong temporal-semantic
+    # locality (retries, re-saves, near-duplicate photos of the same board),
+    # so a query whose embedding is nearly identical to a recent one can
+    # reuse its results without a DB round-trip. Entries carry a TTL so
+    # documents added to a course become visible within minutes even without
+    # explicit invalidation.
+    SEMANTIC_CACHE_TTL = 300          # seconds
+    SEMANTIC_CACHE_PER_COURSE = 64    # entries per course bucket
+    SEMANTIC_HIT_THRESHOLD = 0.97     # min cosine similarity to reuse
+
     def __init__(self):
         """Initialize the vector store service"""
+        # course_id -> list of (normalized query vec, params, expiry, results)
+        self._semantic_cache: Dict[UUID, List[tuple]] = {}
+        self._semantic_cache_lock = Lock()
         logger.info("Vector store service initialized")
 
+    def _semantic_cache_get(
+        self, course_id: UUID, query_vec: np.ndarray, params: tuple
+    ) -> Optional[list]:
+        """Return cached results for a near-identical query, if any.
+
+        Matching entries must share the exact query params (top_k, exclusion,
+        threshold); the embeddings are L2-normalized so cosine similarity is
+        one BLAS matrix-vector product over the bucket.
+        """
+        now = time.monotonic()
+        with self._semantic_cache_lock:
+            bucket = self._semantic_cache.get(course_id)
+            if not bucket:
+                return None
+
+            bucket[:] = [e for e in bucket if e[2] > now]
+            candidates = [e for e in bucket if e[1] == params]
+            if not candidates:
+                return None
+
+            sims = np.stack([e[0] for e in candidates]) @ query_vec
+            best = int(np.argmax(sims))
+            if sims[best] >= self.SEMANTIC_HIT_THRESHOLD:
+                return candidates[best][3]
+            return None
+
+    def _semantic_cache_put(
+        self, course_id: UUID, query_vec: np.ndarray, params: tuple, results: list
+    ) -> None:
+        """Insert query results into the course's cache bucket (FIFO cap)."""
+        expiry = time.monotonic() + self.SEMANTIC_CACHE_TTL
+        with self._semantic_cache_lock:
+            bucket = self._semantic_cache.setdefault(course_id, [])
+            bucket.append((query_vec, params, expiry, results))
+            if len(bucket) > self.SEMANTIC_CACHE_PER_COURSE:
+                del bucket[0]
+
+    @staticmethod
+    def _normalize_query(query_embedding) -> Optional[np.ndarray]:
+        """L2-normalize a query embedding into a float32 ndarray.
+
+        Returns None for degenerate inputs (all-zero or non-finite vectors
+        from a failed encode) — every cosine distance against those is
+        meaningless, so callers should bail out instead of paying for an
+        ANN query whose results would also pollute the semantic cache.
+        """
+        vec = np.asarray(query_embedding, dtype=np.float32)
+        if not np.isfinite(vec).all():
+            return None
+        norm = np.linalg.norm(vec)
+        if norm < 1e-4:
+            return None
+        return vec / norm
+
     def find_similar_documents(
         self,
         db: Session,
@@ -44,10 +139,45 @@ class VectorStoreService:
             List of (Document, similarity_score) tuples, ordered by similarity (highest first)
         """
         try:
+            query_vec = self._normalize_query(query_embedding)
+            if query_vec is None:
+                logger.warning(
+                    f"Degenerate query embedding for course {course_id}; skipping search"
+                )
+                return []
+
+            cache_params = (top_k, exclude_document_id, similarity_threshold)
+
+            cached = self._semantic_cache_get(course_id, query_vec, cache_params)
+            if cached is not None:
+                logger.info(f"Semantic cache hit for course {course_id}")
+                return cached
+
+            # Widen the HNSW candidate list when more results are requested:
+            # the default ef_search (40) caps the scan at 40 graph candidates,
+            # which starves recall once filters discard some of them.
+            # set_config(..., true) scopes the change to this transaction;
+            # SET LOCAL itself cannot take a bind parameter.
+            db.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                {"ef": str(max(40, top_k * 4))}
+            )
+
+            # One shared distance expression: reusing the same ColumnElement
+            # in SELECT, WHERE and ORDER BY compiles to a single bind
+            # parameter, so the 384-dim vector is serialized to the wire
+            # once instead of three times. Cosine distance is scale-
+            # invariant, so binding the normalized query is equivalent.
+            distance = Document.embedding.cosine_distance(query_vec)
+
             # Build query with vector similarity search
+            # formatted_note is deferred on the model; undefer it here so the
+            # callers building excerpts/context don't lazy-load it per row
             query = db.query(
                 Document,
-                (1 - Document.embedding.cosine_distance(query_embedding)).label('similarity')
+                (1 - distance).label('similarity')
+            ).options(
+                undefer(Document.formatted_note)
             ).filter(
                 Document.course_id == course_id,
                 Document.status == 'active',
@@ -58,22 +188,22 @@ class VectorStoreService:
             if exclude_document_id:
                 query = query.filter(Document.id != exclude_document_id)
 
-            # Order by similarity and limit results
-            results = query.order_by(
-                Document.embedding.cosine_distance(query_embedding)
-            ).limit(top_k).all()
+            # Push the similarity threshold into SQL: rows below it would
+            # otherwise waste top_k slots and still get shipped to Python
+            # just to be filtered out. similarity >= t  <=>  distance <= 1-t
+            # (applies at t=0 too: the old Python filter also dropped
+            # negative-similarity rows)
+            query = query.filter(distance <= 1.0 - similarity_threshold)
 
-            # Filter by similarity threshold and convert to list of tuples
-            similar_docs = [
-                (doc, similarity) for doc, similarity in results
-                if similarity >= similarity_threshold
-            ]
+            # Order by similarity and limit results
+            similar_docs = query.order_by(distance).limit(top_k).all()
 
             logger.info(
                 f"Found {len(similar_docs)} similar documents for course {course_id} "
                 f"(threshold={similarity_threshold}, top_k={top_k})"
             )
 
+            self._semantic_cache_put(course_id, query_vec, cache_params, similar_docs)
             return similar_docs
 
         except Exception as e:
@@ -98,39 +228,33 @@ class VectorStoreService:
             List of related note information (id, title, excerpt, similarity)
         """
         try:
-            # Get the source document
-            source_doc = db.query(Document).filter(
-                Document.id == document_id,
-                Document.status == 'active'
-            ).first()
-
-            if not source_doc:
-                logger.warning(f"Document {document_id} not found")
-                return []
+            db.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                {"ef": str(max(40, top_k * 4))}
+            )
 
-            if source_doc.embedding is None or len(source_doc.embedding) == 0:
-                logger.warning(f"Document {document_id} has no embedding")
+            # Single round-trip: source lookup and neighbor search run in one
+            # statement, so the source embedding never leaves the database.
+            # A missing or embedding-less source simply yields zero rows.
+            rows = db.execute(_RELATED_NOTES_SQL, {
+                "doc_id": document_id,
+                "max_distance": 0.7,  # similarity >= 0.3: reasonably similar
+                "top_k": top_k
+            }).mappings().all()
+
+            if not rows:
+                logger.info(f"No related notes for document {document_id}")
                 return []
 
-            # Find similar documents in the same course
-            similar_docs = self.find_similar_documents(
-                db=db,
-                query_embedding=source_doc.embedding,
-                course_id=source_doc.course_id,
-                top_k=top_k,
-                exclude_document_id=document_id,
-                similarity_threshold=0.3  # Only show reasonably similar notes
-            )
-
             # Format results for frontend
             related_notes = []
-            for doc, similarity in similar_docs:
+            for row in rows:
                 related_notes.append({
-                    'id': str(doc.id),
-                    'title': doc.title,
-                    'excerpt': doc.excerpt or doc.formatted_note[:200],
-                    'similarity': round(similarity, 3),
-                    'created_at': doc.created_at.isoformat() if doc.created_at else None
+                    'id': str(row['id']),
+                    'title': row['title'],
+                    'excerpt': row['excerpt'] or row['formatted_note'][:200],
+                    'similarity': round(row['similarity'], 3),
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None
                 })
 
             return related_notes
@@ -223,6 +347,10 @@ class VectorStoreService:
             doc.embedding = embedding
             db.commit()
 
+            # Cached search results for this course may now be stale
+            with self._semantic_cache_lock:
+                self._semantic_cache.pop(doc.course_id, None)
+
             logger.info(f"Updated embedding for document {document_id}")
             return True
 
@@ -231,6 +359,57 @@ class VectorStoreService:
             db.rollback()
             return False
 
+    def bulk_update_embeddings(
+        self,
+        db: Session,
+        items: List[Tuple[UUID, List[float]]]
+    ) -> int:
+        """
+        Update embeddings for many documents in one batched round-trip.
+
+        Intended for re-indexing jobs: the per-document UPDATE loop paid one
+        network round-trip per row, while this executemany form is paged into
+        batches by the driver (see executemany_mode on the sync engine) and
+        committed once.
+
+        Args:
+            db: Database session
+            items: List of (document_id, embedding) pairs
+
+        Returns:
+            Number of documents updated (0 on failure)
+        """
+        if not items:
+            return 0
+
+        try:
+            stmt = update(Document).where(
+                Document.id == bindparam("doc_id")
+            ).values(embedding=bindparam("emb"))
+
+            # Execute at the Core level: Session.execute would route an
+            # executemany UPDATE with extra WHERE criteria into ORM bulk
+            # persistence, which rejects this form. There is nothing to
+            # synchronize anyway — callers hold no loaded Document instances
+            # they keep using after the update.
+            db.connection().execute(
+                stmt,
+                [{"doc_id": doc_id, "emb": emb} for doc_id, emb in items]
+            )
+            db.commit()
+
+            # Bulk re-indexing can touch any course; drop all cached results
+            with self._semantic_cache_lock:
+                self._semantic_cache.clear()
+
+            logger.info(f"Bulk-updated embeddings for {len(items)} documents")
+            return len(items)
+
+        except Exception as e:
+            logger.error(f"Error bulk-updating embeddings: {e}")
+            db.rollback()
+            return 0
+
     def get_documents_without_embeddings(
         self,
         db: Session,
@@ -247,7 +426,9 @@ class VectorStoreService:
             List of documents without embeddings
         """
         try:
-            docs = db.query(Document).filter(
+            docs = db.query(Document).options(
+                undefer(Document.formatted_note)
+            ).filter(
                 Document.status == 'active',
                 Document.embedding.is_(None)
             ).limit(limit).all()
@@ -275,21 +456,22 @@ class VectorStoreService:
             Dictionary with 'total', 'with_embeddings', 'without_embeddings'
         """
         try:
-            total = db.query(Document).filter(
+            # Both counts come from the same filtered set, so take them in
+            # one scan with a FILTER aggregate instead of two round-trips
+            row = db.query(
+                func.count(Document.id).label('total'),
+                func.count(Document.id).filter(
+                    Document.embedding.isnot(None)
+                ).label('with_embeddings')
+            ).filter(
                 Document.course_id == course_id,
                 Document.status == 'active'
-            ).count()
-
-            with_embeddings = db.query(Document).filter(
-                Document.course_id == course_id,
-                Document.status == 'active',
-                Document.embedding.isnot(None)
-            ).count()
+            ).one()
 
             return {
-                'total': total,
-                'with_embeddings': with_embeddings,
-                'without_embeddings': total - with_embeddings
+                'total': row.total,
+                'with_embeddings': row.with_embeddings,
+                'without_embeddings': row.total - row.with_embeddings
             }
 
         except Exception as e:
@@ -297,12 +479,13 @@ class VectorStoreService:
             return {'total': 0, 'with_embeddings': 0, 'without_embeddings': 0}
 
 
-# Singleton instance
-_vector_store_service = None
+# Eager module-level singleton (same pattern as ocr_service/llm_service):
+# construction is cheap, import machinery makes it race-free, and the
+# semantic cache can never be split across two racing instances the way a
+# lazily-initialized accessor could allow
+_vector_store_service = VectorStoreService()
+
 
 def get_vector_store() -> VectorStoreService:
-    """Get or create the singleton vector store service instance"""
-    global _vector_store_service
-    if _vector_store_service is None:
-        _vector_store_service = VectorStoreService()
+    """Get the singleton vector store service instance"""
     return _vector_store_service